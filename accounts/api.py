@@ -0,0 +1,133 @@
+"""
+Read-only JSON API for projects and positions.
+
+Both listings accept ?skill=<tag slug> and ?status=open|filled (for
+projects: having a position with that skill and status) and return pages
+of {"results": [...], "next": <url or null>}, newest first, with the same
+keyset cursors as the HTML listings.
+
+?format=ndjson instead streams every matching row, oldest first, one JSON
+object per line. Rows are read with QuerySet.iterator() in chunks of
+EXPORT_CHUNK_SIZE, so memory use does not depend on the number of rows.
+?since_id=<id> resumes an interrupted export after the last id received.
+It is a plain id, not a page cursor, hence the different name; ?after is
+rejected with ndjson.
+"""
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from . import choices
+from . import models
+from .pagination import PAGE_SIZE, keyset_page, parse_id_cursor
+from .routers import replica_reads
+
+
+MAX_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 2000
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+PROJECT_FIELDS = ('id', 'title', 'description', 'timeline', 'requirements', 'skill_needs', 'url', 'user_id')
+POSITION_FIELDS = ('id', 'project_id', 'name', 'descript', 'skill', 'tag__slug', 'status')
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def filter_projects(params):
+    projects = models.Project.objects.all()
+    position_filters = position_lookups(params, 'position__')
+    if position_filters:
+        # One filter() call, so skill and status have to match on the same position
+        projects = projects.filter(**position_filters).distinct()
+    return projects
+
+
+def filter_positions(params):
+    positions = models.Position.objects.filter(**position_lookups(params))
+    project = params.get('project')
+    if project is not None:
+        project_id = parse_id_cursor(project)
+        if project_id is None:
+            raise InvalidFilter("project must be a project id")
+        positions = positions.filter(project_id=project_id)
+    return positions
+
+
+def position_lookups(params, prefix=''):
+    lookups = {}
+    if params.get('skill'):
+        lookups[prefix + 'tag__slug'] = params['skill']
+    status = params.get('status')
+    if status:
+        if status not in dict(choices.STATUS):
+            raise InvalidFilter("status must be one of: {}".format(', '.join(dict(choices.STATUS))))
+        lookups[prefix + 'status'] = status
+    return lookups
+
+
+def page_size(params):
+    try:
+        return max(1, min(int(params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise InvalidFilter("limit must be a number")
+
+
+def position_row(row):
+    row['tag'] = row.pop('tag__slug')
+    return row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+def listing(request, queryset, fields, convert=lambda row: row):
+    """A JSON page of the queryset, or all of it as NDJSON"""
+    if request.GET.get('format') == 'ndjson':
+        if 'after' in request.GET:
+            raise InvalidFilter("ndjson exports resume with since_id=<last id received>, not after")
+        rows = queryset.order_by('id')
+        if 'since_id' in request.GET:
+            since_id = parse_id_cursor(request.GET['since_id'])
+            if since_id is None:
+                raise InvalidFilter("since_id must be an id")
+            rows = rows.filter(id__gt=since_id)
+        rows = rows.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return StreamingHttpResponse(ndjson_lines(convert(row) for row in rows),
+                                     content_type=NDJSON_CONTENT_TYPE)
+
+    page = keyset_page(queryset.values(*fields), request.GET.get('after'), page_size(request.GET))
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['after'] = page.next_cursor
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+    return JsonResponse({'results': [convert(row) for row in page], 'next': next_url})
+
+
+def invalid(error):
+    return JsonResponse({'errors': {'filter': [str(error)]}}, status=400)
+
+
+@replica_reads
+@require_GET
+def projects(request):
+    """Projects, filtered by the skill and status of their positions"""
+    try:
+        return listing(request, filter_projects(request.GET), PROJECT_FIELDS)
+    except InvalidFilter as error:
+        return invalid(error)
+
+
+@replica_reads
+@require_GET
+def positions(request):
+    """Positions, filtered by skill, status and project"""
+    try:
+        return listing(request, filter_positions(request.GET), POSITION_FIELDS, position_row)
+    except InvalidFilter as error:
+        return invalid(error)
@@ -0,0 +1,178 @@
+"""
+Static asset bundles.
+
+`manage.py build_assets` concatenates the sources of each bundle in BUNDLES
+into ASSETS_BUILD_DIR, following CSS @import statements and minifying the
+CSS, then runs collectstatic. The storage backend gives every collected
+file a content-hashed name and writes gzip (and, when the brotli package is
+installed, brotli) copies of text files next to it.
+
+serve() hands collected files out with precompressed bodies where the client
+accepts them, and with a year-long immutable Cache-Control for hashed names:
+a changed file gets a new name, so a cached copy never goes stale.
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+BUNDLES = {
+    'css/bundle.css': ('css/global.css',),
+    'js/bundle.js': ('js/autogrow.js', 'js/global.js'),
+}
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+# Hashed names are <name>.<first 12 hex digits of the MD5 of the content>.<ext>
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=300'
+
+# Strings and comments are matched first so their contents are left alone
+CSS_TOKEN = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|([^"'/]+|.)''', re.S)
+CSS_IMPORT = re.compile(r'''(?:^|(?<=[;}]))\s*@import\s+(?:url\(\s*)?["']?([^"')\s;]+)["']?\s*\)?\s*([^;]*);''', re.M)
+CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+CSS_SPACE_AFTER_COLON = re.compile(r':\s+')
+
+
+def css_code(text):
+    """(code, verbatim) pieces of a stylesheet; strings are verbatim, comments are dropped"""
+    for string, comment, code in CSS_TOKEN.findall(text):
+        if string:
+            yield string, True
+        elif code:
+            yield code, False
+
+
+def minify_css(text):
+    pieces = []
+    for piece, verbatim in css_code(text):
+        if not verbatim:
+            piece = re.sub(r'\s+', ' ', piece)
+            piece = CSS_SPACE_AROUND.sub(r'\1', piece)
+            piece = CSS_SPACE_AFTER_COLON.sub(':', piece)
+        pieces.append(piece)
+    return ''.join(pieces).replace(';}', '}').strip()
+
+
+def read_css(path, seen=None):
+    """A stylesheet with its local @imports inlined; imports with media queries are wrapped in @media"""
+    seen = set() if seen is None else seen
+    path = os.path.realpath(path)
+    if path in seen:
+        return ''
+    seen.add(path)
+    with open(path, encoding='utf-8') as source:
+        text = source.read()
+
+    def inline(match):
+        target, media = match.group(1), match.group(2).strip()
+        if re.match(r'^([a-z]+:)?//', target):
+            return match.group(0)
+        css = read_css(os.path.join(os.path.dirname(path), target), seen)
+        return '@media {}{{{}}}'.format(media, css) if media else css
+
+    # Dropping the comments first keeps commented out imports out
+    return CSS_IMPORT.sub(inline, ''.join(piece for piece, verbatim in css_code(text)))
+
+
+def source_path(name):
+    for directory in settings.STATICFILES_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("Bundle source {} is not in STATICFILES_DIRS".format(name))
+
+
+def build_bundle(name, sources):
+    if name.endswith('.css'):
+        return minify_css('\n'.join(read_css(source_path(source)) for source in sources))
+    texts = []
+    for source in sources:
+        with open(source_path(source), encoding='utf-8') as script:
+            # Scripts are only concatenated; the semicolons keep them separate statements
+            texts.append(script.read().strip() + '\n;')
+    return '\n'.join(texts)
+
+
+def build_bundles(output_dir):
+    """Write every bundle into output_dir; returns {name: size in bytes}"""
+    sizes = {}
+    for name, sources in BUNDLES.items():
+        path = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = build_bundle(name, sources).encode('utf-8')
+        with open(path, 'wb') as output:
+            output.write(content)
+        sizes[name] = len(content)
+    return sizes
+
+
+def compressible(name):
+    return name.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def gzip_bytes(content):
+    # No timestamp, so rebuilding unchanged files gives identical output
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as output:
+        output.write(content)
+    return buffer.getvalue()
+
+
+def precompress(path):
+    """Write <path>.gz and <path>.br where they are smaller than the file"""
+    with open(path, 'rb') as source:
+        content = source.read()
+    variants = [('.gz', gzip_bytes(content))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as output:
+                output.write(compressed)
+
+
+def accepted_encodings(request):
+    return {encoding.split(';')[0].strip() for encoding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+
+
+@require_safe
+def serve(request, path):
+    """A collected static file, precompressed if possible, cached for a year if its name is hashed"""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    encodings = accepted_encodings(request)
+    chosen, encoding = full_path, None
+    for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if name in encodings and os.path.isfile(full_path + suffix):
+            chosen, encoding = full_path + suffix, name
+            break
+
+    response = FileResponse(open(chosen, 'rb'), content_type=content_type)
+    response['Content-Length'] = os.path.getsize(chosen)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if compressible(full_path):
+        response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(path) else CACHE_CONTROL
+    return response
@@ -0,0 +1,78 @@
+"""
+Avatar renditions.
+
+Uploads are stored under their content hash (see storage.ContentAddressedStorage)
+and the process_avatars command later renders them into square WebP
+thumbnails, one per size in AVATAR_SIZES, stored next to the original as
+avatars/<size>/<original name>.webp.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import models
+
+
+AVATAR_SIZES = (48, 200, 400)
+RENDITION_FORMAT = 'WEBP'
+RENDITION_EXTENSION = '.webp'
+RENDITION_QUALITY = 80
+
+
+def rendition_name(name, size):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, str(size), stem + RENDITION_EXTENSION)
+
+
+def rendition_size(size):
+    """Smallest rendered size that still fills a box of `size` pixels"""
+    for available in AVATAR_SIZES:
+        if available >= size:
+            return available
+    return AVATAR_SIZES[-1]
+
+
+def render(field_file):
+    """Write any missing renditions of an uploaded image"""
+    missing = [size for size in AVATAR_SIZES if not default_storage.exists(rendition_name(field_file.name, size))]
+    if not missing:
+        return
+    with field_file.storage.open(field_file.name) as source:
+        image = Image.open(source)
+        image.load()
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    for size in missing:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, RENDITION_FORMAT, quality=RENDITION_QUALITY)
+        default_storage.save(rendition_name(field_file.name, size), ContentFile(output.getvalue()))
+
+
+def process_pending(limit=None):
+    """Render avatars of profiles whose upload has not been processed yet"""
+    profiles = models.Profile.objects.filter(avatar_processed=False).only('id', 'avatar')
+    if limit:
+        profiles = profiles[:limit]
+    processed = 0
+    for profile in profiles:
+        try:
+            render(profile.avatar)
+        except OSError:
+            # Missing or unreadable image: keep serving the original
+            continue
+        models.Profile.objects.filter(id=profile.id, avatar=profile.avatar.name).update(
+            avatar_processed=True, updated=timezone.now())
+        processed += 1
+    return processed
+
+
+def avatar_url(profile, size):
+    """URL of the best rendition for a box of `size` pixels, or the original until it is processed"""
+    if not profile.avatar_processed:
+        return profile.avatar.url
+    return default_storage.url(rendition_name(profile.avatar.name, rendition_size(size)))
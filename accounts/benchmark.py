@@ -0,0 +1,118 @@
+"""
+Load benchmark for the pages in accounts/urls.py.
+
+Each named URL is requested through the test client as the owner of a
+seeded project, and its latency percentiles and query count are reported.
+Run it against a database filled by the seed command and keep the JSON
+output to compare runs over time.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import models
+from . import urls
+
+
+ITERATIONS = 20
+
+# Views that change data or the session on GET, or only accept POST
+SKIPPED = {
+    'metrics': "instrumentation, not a page",
+    'sign_out': "logs the client out",
+    'project_bulk': "POST only",
+    'applications_decide': "POST only",
+    'skill_delete': "deletes on GET",
+    'position_delete': "deletes on GET",
+    'application_delete': "deletes on GET",
+}
+
+# The debug toolbar only renders for INTERNAL_IPS and would dominate the timings
+REMOTE_ADDR = '203.0.113.1'
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def server_name():
+    """A host ALLOWED_HOSTS accepts; the client's 'testserver' is only allowed under the test runner"""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def benchmark_user():
+    """Owner of a project that has applications, so every page has something to show"""
+    application = models.Application.objects.select_related('position__project__user').order_by('id').first()
+    return application and application.position.project.user
+
+
+def sample_urls(user):
+    """(name, url) for every named accounts URL, with its arguments filled from the user's data"""
+    application = models.Application.objects.filter(position__project__user=user).order_by('id').first()
+    project = application.position.project
+    other_position = models.Position.objects.exclude(project__user=user).order_by('id').first()
+    kwargs = {
+        'project_edit': {'pk': project.id},
+        'project': {'pk': project.id},
+        'project_delete': {'pk': project.id},
+        'project_applications_export': {'pk': project.id},
+        'application_detail': {'pk': application.id},
+        'application_new': {'pk': other_position.id if other_position else application.position_id},
+        'sort': {'skillz': application.position.tag.slug if application.position.tag else 'python'},
+    }
+    queries = {
+        'search': '?q=' + project.title.split()[0],
+    }
+    for pattern in urls.urlpatterns:
+        name = getattr(pattern, 'name', None)
+        if name and name not in SKIPPED:
+            url = reverse('{}:{}'.format(urls.app_name, name), kwargs=kwargs.get(name))
+            yield name, url + queries.get(name, '')
+
+
+def measure(client, url, iterations=ITERATIONS):
+    client.get(url)  # warm up caches and templates
+    timings = []
+    query_counts = []
+    for iteration in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries))
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'queries': percentile(query_counts, 50),
+        'max_queries': max(query_counts),
+    }
+
+
+def run(user, iterations=ITERATIONS):
+    """Benchmark every page as `user` and return a JSON-serialisable report"""
+    client = Client(REMOTE_ADDR=REMOTE_ADDR, SERVER_NAME=server_name())
+    client.force_login(user)
+    results = {name: measure(client, url, iterations) for name, url in sample_urls(user)}
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'iterations': iterations,
+        'rows': {
+            'users': models.User.objects.count(),
+            'projects': models.Project.objects.count(),
+            'positions': models.Position.objects.count(),
+            'applications': models.Application.objects.count(),
+        },
+        'results': results,
+        'skipped': SKIPPED,
+    }
@@ -0,0 +1,33 @@
+"""
+Version counters kept in the shared cache.
+
+Cached data is keyed by a counter that writers bump, so nothing has to be
+deleted and a reader can never see content older than the last write.
+"""
+from django.core.cache import cache
+
+
+PROJECTS_VERSION_KEY = 'projects:version'
+
+
+def get_version(key):
+    cache.add(key, 1, None)
+    return cache.get(key) or 1
+
+
+def bump_version(key):
+    """Increment a counter and return its new value, or None if it had been evicted"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+        return None
+
+
+def projects_version():
+    """Changes whenever a project or position is written"""
+    return get_version(PROJECTS_VERSION_KEY)
+
+
+def bump_projects_version():
+    return bump_version(PROJECTS_VERSION_KEY)
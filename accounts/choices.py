@@ -32,4 +32,24 @@ APP_STATUS = (
     (APPROVED, 'Approved'),
     (DENIED, 'Denied'),
     (UNDECIDED, 'Undecided')
-)
\ No newline at end of file
+)
+
+"""Outbox Message Status"""
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+OUTBOX_STATUS = (
+    (PENDING, 'Pending'),
+    (SENT, 'Sent'),
+    (FAILED, 'Failed')
+)
+
+"""Notification Modes"""
+IMMEDIATE = 'immediate'
+DIGEST = 'digest'
+
+NOTIFICATION_MODES = (
+    (IMMEDIATE, 'Email me about each decision'),
+    (DIGEST, 'Send me one daily digest')
+)
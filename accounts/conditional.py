@@ -0,0 +1,60 @@
+"""
+Conditional GET for rendered pages.
+
+ConditionalMixin works like the condition() decorator for class based
+views: page_state() reads what the page was rendered from, usually with a
+single query, and a GET whose If-None-Match or If-Modified-Since still
+matches is answered with 304 Not Modified without rendering anything.
+
+The ETag also covers what layout.html shows of the signed in user (taken
+from request.identity, so usually from the cache) and the CSRF secret the
+page's forms were rendered with.
+"""
+import hashlib
+from calendar import timegm
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def viewer_state(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    identity = request.identity
+    profile = identity.profile
+    counts = identity.application_counts
+    return (user.id, profile.updated if profile else None, counts.undecided if counts else 0)
+
+
+def page_etag(request, state):
+    csrf = request.META.get('CSRF_COOKIE', '')
+    key = repr((state, viewer_state(request), csrf)).encode()
+    return quote_etag(hashlib.md5(key).hexdigest())
+
+
+class ConditionalMixin:
+    def page_state(self):
+        """(anything that changes when the page does, last modified datetime or None)"""
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        # Pending messages are shown once, so the page has to be rendered
+        if len(get_messages(request)):
+            return super().get(request, *args, **kwargs)
+
+        state, last_modified = self.page_state()
+        etag = page_etag(request, state)
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Stored, but checked with the server before every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,3 @@
+def identity(request):
+    """The signed in user's cached profile, skills and application counts; see accounts.identity"""
+    return {'identity': getattr(request, 'identity', None)}
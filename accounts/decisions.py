@@ -0,0 +1,103 @@
+"""
+Approving and denying many applications at once.
+
+decide() runs in one transaction. Applications are updated with one UPDATE
+per position and status change, each matching only rows still in the
+status it changes from, so counters follow the rows actually updated even
+when someone decides the same applications concurrently. Approving fills
+the position, and with deny_others the position's remaining undecided
+applicants are denied as well. The decision emails (or digest events) are
+queued with one bulk insert, and the counters, facets and caches that
+Application and Position signals would maintain are updated once for the
+whole batch.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from . import choices
+from . import matching
+from . import models
+from . import notifications
+from . import readmodels
+
+
+def decide(decisions, sender, deny_others=False):
+    """
+    Apply (application, status) pairs; the applications need user__user
+    and position loaded. Returns (applications changed, positions filled).
+    """
+    decisions = list(decisions)
+    with transaction.atomic():
+        # The statuses the form saw may be stale: re-read them, locked where the database can
+        current = dict(models.Application.objects.select_for_update()
+                       .filter(id__in=[application.id for application, status in decisions])
+                       .values_list('id', 'status'))
+        changes = [(application, status) for application, status in decisions
+                   if application.id in current and current[application.id] != status]
+        for application, status in changes:
+            application.status = current[application.id]
+
+        approved = {application.position_id for application, status in changes if status == choices.APPROVED}
+        if deny_others and approved:
+            others = (models.Application.objects.select_for_update()
+                      .filter(position_id__in=approved, status=choices.UNDECIDED)
+                      .exclude(id__in=[application.id for application, status in decisions])
+                      .select_related('user__user', 'position'))
+            changes += [(application, choices.DENIED) for application in others]
+
+        changed = apply_changes(changes)
+        filled = fill_positions(approved)
+        notifications.queue_decisions(changed, sender)
+    return len(changed), filled
+
+
+def apply_changes(changes):
+    """
+    Update (application, status) pairs with one UPDATE per position and
+    status change, each only matching rows still in the old status, and
+    count what was actually updated; returns the changed applications
+    """
+    now = timezone.now()
+    groups = {}
+    for application, status in changes:
+        groups.setdefault((application.position_id, application.status, status), []).append(application)
+
+    counts = Counter()
+    changed = []
+    for (position_id, old_status, status), applications in groups.items():
+        ids = [application.id for application in applications]
+        updated = models.Application.objects.filter(id__in=ids, status=old_status).update(status=status, updated=now)
+        counts[position_id, old_status] -= updated
+        counts[position_id, status] += updated
+        if updated < len(ids):
+            # Some were decided concurrently; keep the ones this update changed
+            ours = set(models.Application.objects.filter(id__in=ids, status=status, updated=now)
+                       .values_list('id', flat=True))
+            applications = [application for application in applications if application.id in ours]
+        for application in applications:
+            application.status = status
+        changed += applications
+    models.count_applications(counts)
+    return changed
+
+
+def fill_positions(position_ids):
+    """Mark open positions filled, doing what the Position signals would; returns how many changed"""
+    positions = list(models.Position.objects.filter(id__in=position_ids, status=choices.OPEN)
+                     .values_list('id', 'project_id', 'tag_id'))
+    if not positions:
+        return 0
+    models.Position.objects.filter(id__in=[position_id for position_id, project_id, tag_id in positions]).update(
+        status=choices.FILLED, updated=timezone.now())
+
+    closed = Counter(tag_id for position_id, project_id, tag_id in positions if tag_id)
+    models.SkillFacet.objects.adjust({tag_id: -count for tag_id, count in closed.items()})
+    project_ids = {project_id for position_id, project_id, tag_id in positions}
+    models.touch_projects(project_ids)
+    matching.invalidate()
+    caching.bump_projects_version()
+    readmodels.refresh_project_cards(project_ids)
+    return len(positions)
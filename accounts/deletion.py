@@ -0,0 +1,104 @@
+"""
+Soft deletion of projects and batched purging of their rows.
+
+soft_delete_project() only stamps deleted_at, which hides the project, its
+positions and its applications from the default managers, and does in a
+few grouped queries what the delete signals would: it drops the project
+from the search index, the skill facets, the application counters, the
+match matrix, the listing version and its card.
+
+purge_deleted() later removes the rows of deleted projects with raw
+`DELETE ... WHERE id IN (...)` statements of at most batch_size ids, each
+in its own short transaction. Rows that cascade from a project (positions,
+their applications and counters, skill taggings) are found through the
+model relations and removed first, so no transaction waits on Django's
+delete collector loading every related row.
+"""
+import time
+from collections import Counter
+
+from django.db import connection, models as db_models, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import caching
+from . import choices
+from . import matching
+from . import models
+from . import readmodels
+from . import search
+
+
+PURGE_BATCH_SIZE = 500
+
+
+def soft_delete_project(project_id):
+    """Hide a project at once; False if it was already deleted"""
+    with transaction.atomic():
+        if not models.Project.all_objects.filter(id=project_id, deleted_at__isnull=True).update(
+                deleted_at=timezone.now()):
+            return False
+
+        positions = models.Position.all_objects.filter(project_id=project_id)
+        open_positions = (positions.filter(status=choices.OPEN, tag__isnull=False)
+                          .values_list('tag_id').annotate(Count('id')).order_by())
+        models.SkillFacet.objects.adjust({tag_id: -count for tag_id, count in open_positions})
+
+        applications = (models.Application.all_objects.filter(position__project_id=project_id)
+                        .values_list('position_id', 'status').annotate(Count('id')).order_by())
+        models.count_applications(Counter({(position_id, status): -count
+                                           for position_id, status, count in applications}))
+
+        search.remove_project(project_id)
+        matching.invalidate()
+        caching.bump_projects_version()
+        readmodels.refresh_project_cards([project_id])
+    return True
+
+
+def cascades(model):
+    """(child model, column, on_delete) of every relation pointing at model, m2m through tables included"""
+    for relation in model._meta.get_fields(include_hidden=True):
+        if relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one):
+            yield relation.related_model, relation.field.attname, relation.on_delete
+
+
+def delete_ids(model, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(table, column, ', '.join(['%s'] * len(ids))), ids)
+        return cursor.rowcount
+
+
+def purge_rows(model, column, values, batch_size, counts, pause=0.0):
+    """Delete the rows of model whose column is one of values, and whatever cascades from them"""
+    while True:
+        ids = list(model._base_manager.filter(**{column + '__in': values})
+                   .values_list('pk', flat=True).order_by('pk')[:batch_size])
+        if not ids:
+            return
+        for child, child_column, on_delete in cascades(model):
+            if on_delete is db_models.CASCADE:
+                purge_rows(child, child_column, ids, batch_size, counts, pause)
+            elif on_delete is db_models.SET_NULL:
+                with transaction.atomic():
+                    child._base_manager.filter(**{child_column + '__in': ids}).update(**{child_column: None})
+            elif on_delete is not db_models.DO_NOTHING:
+                raise ValueError("Cannot purge {} rows referenced by {}.{}".format(
+                    model._meta.label, child._meta.label, child_column))
+        counts[model._meta.label] += delete_ids(model, ids)
+        if pause:
+            # Let other writers take the database lock between batches
+            time.sleep(pause)
+
+
+def purge_deleted(batch_size=PURGE_BATCH_SIZE, pause=0.0, before=None):
+    """Remove soft-deleted projects (deleted before `before`, if given); returns {model label: rows deleted}"""
+    projects = models.Project.all_objects.filter(deleted_at__isnull=False)
+    if before is not None:
+        projects = projects.filter(deleted_at__lt=before)
+    counts = Counter()
+    for project_id in list(projects.values_list('id', flat=True).order_by('id')):
+        purge_rows(models.Project, 'id', [project_id], batch_size, counts, pause)
+    return counts
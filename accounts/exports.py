@@ -0,0 +1,58 @@
+"""
+CSV export of applications.
+
+Rows are written one at a time into a StreamingHttpResponse: csv.writer
+writes into Echo, which hands each formatted line straight back instead
+of buffering it, and the applications are read with QuerySet.iterator()
+so only EXPORT_CHUNK_SIZE of them are in memory at once.
+"""
+import csv
+
+from . import models
+
+
+EXPORT_CHUNK_SIZE = 2000
+HEADER = ('application', 'project', 'position', 'skill', 'first name', 'last name', 'email', 'status')
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+class Echo:
+    """File-like object whose write() returns what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def cell(value):
+    value = '' if value is None else str(value)
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def applications_for(owner, project_id=None):
+    applications = models.Application.objects.filter(position__project__user=owner)
+    if project_id is not None:
+        applications = applications.filter(position__project_id=project_id)
+    return applications.select_related('user', 'position__project').only(
+        'id', 'status',
+        'user__first_name', 'user__last_name', 'user__email',
+        'position__name', 'position__skill', 'position__project__title',
+    ).order_by('position__project_id', 'position_id', 'id')
+
+
+def csv_lines(applications):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for application in applications.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([cell(value) for value in (
+            application.id,
+            application.position.project.title,
+            application.position.name,
+            application.position.skill,
+            application.user.first_name,
+            application.user.last_name,
+            application.user.email,
+            application.status,
+        )])
@@ -7,10 +7,22 @@ from . import choices
 class ProfileForm(forms.ModelForm):
     avatar = forms.ImageField(required=False)
     bio = forms.CharField(widget=forms.Textarea, required=False)
+    notification_mode = forms.ChoiceField(choices=choices.NOTIFICATION_MODES, required=False,
+                                          label="Application emails")
 
     class Meta:
         model = models.Profile
-        fields = ['first_name', 'last_name', 'bio', 'avatar']
+        fields = ['first_name', 'last_name', 'bio', 'avatar', 'notification_mode']
+
+    def clean_notification_mode(self):
+        # Keep the current choice when the field is not posted
+        return self.cleaned_data['notification_mode'] or self.instance.notification_mode
+
+    def save(self, commit=True):
+        if 'avatar' in self.changed_data:
+            # New upload: process_avatars renders its thumbnails
+            self.instance.avatar_processed = False
+        return super().save(commit)
 
 
 class ProjectForm(forms.ModelForm):
@@ -53,3 +65,15 @@ class StatusForm(forms.ModelForm):
         model = models.Application
         fields = ['status']
 
+
+class DecisionForm(forms.Form):
+    """Approve or deny several applications to the owner's projects from the inbox"""
+    application = forms.ModelMultipleChoiceField(queryset=models.Application.objects.none())
+    status = forms.ChoiceField(choices=[(choices.APPROVED, 'Approve'), (choices.DENIED, 'Deny')])
+    deny_others = forms.BooleanField(required=False)
+
+    def __init__(self, owner, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['application'].queryset = models.Application.objects.filter(
+            position__project__user=owner).select_related('user__user', 'position')
+
@@ -0,0 +1,76 @@
+"""
+Request-scoped identity of the signed in user.
+
+IdentityMiddleware sets request.identity, and the identity context processor
+exposes it to templates. Nothing is loaded until the profile, skills or
+application counts are first used. They are then read from one shared cache
+entry, or on a miss with two queries, and kept for IDENTITY_TIMEOUT seconds.
+Profile, skill and application count changes delete the entry.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.functional import cached_property
+
+from . import models
+
+
+IDENTITY_KEY = 'identity:{}'
+IDENTITY_TIMEOUT = 60
+
+
+def identity_key(user_id):
+    return IDENTITY_KEY.format(user_id)
+
+
+def load(user_id):
+    # Always from the primary: conditional GET ETags are built from the
+    # cached identity, so one read from a lagging replica could answer 304
+    # for a stale page until the entry expires
+    profile = (models.Profile.objects.using(DEFAULT_DB_ALIAS).select_related('user__application_counts')
+               .filter(user_id=user_id).first())
+    return {
+        'profile': profile,
+        'skills': list(models.Skill.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).order_by('id')),
+        'application_counts': getattr(profile.user, 'application_counts', None) if profile else None,
+    }
+
+
+def invalidate(user_ids):
+    """Drop cached identities now, and again once the transaction commits in case one was re-read meanwhile"""
+    keys = [identity_key(user_id) for user_id in set(user_ids)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class Identity:
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _data(self):
+        if not self.user.is_authenticated:
+            return {'profile': None, 'skills': [], 'application_counts': None}
+        key = identity_key(self.user.id)
+        data = cache.get(key)
+        if data is None:
+            data = load(self.user.id)
+            cache.set(key, data, IDENTITY_TIMEOUT)
+        if data['profile'] is not None:
+            data['profile'].user = self.user
+        return data
+
+    @property
+    def profile(self):
+        return self._data['profile']
+
+    @property
+    def skills(self):
+        return self._data['skills']
+
+    @property
+    def skill_tag_ids(self):
+        return [skill.tag_id for skill in self.skills if skill.tag_id]
+
+    @property
+    def application_counts(self):
+        return self._data['application_counts']
@@ -0,0 +1,207 @@
+"""
+Bulk import of projects and their positions.
+
+Each project is validated with ProjectForm and its positions with
+PositionForm, so an import accepts exactly what the project form would.
+A project is rejected as a whole if it or any of its positions is invalid.
+Valid projects are written BATCH_SIZE at a time, each batch in one
+transaction with bulk_create, and the derived data the model signals
+would maintain (skill tags, the search index, facets, the match matrix
+and the listing version) is updated once per batch.
+
+CSV input has one row per position; consecutive rows with the same owner
+and title make up one project:
+
+    owner,title,description,timeline,requirements,skill_needs,position_name,position_skill,position_descript
+
+JSON input is a list of objects shaped like the project/bulk/ payload,
+plus an optional "owner" username.
+"""
+import csv
+import json
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+
+from . import caching
+from . import choices
+from . import forms
+from . import models
+from . import search
+
+
+BATCH_SIZE = 500
+ID_ATTEMPTS = 3
+
+PROJECT_COLUMNS = ('title', 'description', 'timeline', 'requirements', 'skill_needs')
+POSITION_COLUMNS = ('name', 'skill', 'descript')
+
+
+def read_csv(source):
+    """Records of {'line', 'owner', 'project', 'positions'}"""
+    reader = csv.DictReader(source)
+    record = None
+    for row in reader:
+        key = (row.get('owner') or '', row.get('title') or '')
+        if record is None or key != (record['owner'] or '', record['project'].get('title') or ''):
+            if record is not None:
+                yield record
+            record = {
+                'line': reader.line_num,
+                'owner': row.get('owner'),
+                'project': {column: row.get(column) for column in PROJECT_COLUMNS},
+                'positions': [],
+            }
+        position = {column: row.get('position_' + column) for column in POSITION_COLUMNS}
+        if any(position.values()):
+            record['positions'].append(position)
+    if record is not None:
+        yield record
+
+
+def read_json(source):
+    """Records of {'line', 'owner', 'project', 'positions'}; 'line' is the position in the list"""
+    data = json.load(source)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of projects")
+    for number, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            item = {}
+        positions = item.get('positions')
+        yield {
+            'line': number,
+            'owner': item.get('owner'),
+            'project': item,
+            'positions': positions if isinstance(positions, list) else [],
+        }
+
+
+class ProjectImporter:
+    def __init__(self, default_owner=None, batch_size=BATCH_SIZE, progress=None):
+        self.default_owner = default_owner
+        self.batch_size = batch_size
+        self.progress = progress
+        self.owners = {}
+        self.tags = {}
+        self.projects = 0
+        self.positions = 0
+        self.rejects = []
+
+    def owner_id(self, username):
+        if not username:
+            return self.default_owner.id if self.default_owner else None
+        if username not in self.owners:
+            self.owners[username] = models.User.objects.filter(username=username).values_list(
+                'id', flat=True).first()
+        return self.owners[username]
+
+    def reject(self, record, errors):
+        self.rejects.append({'line': record['line'], 'title': record['project'].get('title'), 'errors': errors})
+
+    def validate(self, record):
+        """(unsaved project, unsaved positions), or None once the record is rejected"""
+        errors = {}
+        owner_id = self.owner_id(record['owner'])
+        if owner_id is None:
+            errors['owner'] = ["Unknown owner {!r}".format(record['owner'] or '')]
+
+        project_form = forms.ProjectForm(record['project'])
+        if not project_form.is_valid():
+            errors.update(project_form.errors)
+        position_forms = [forms.PositionForm(row if isinstance(row, dict) else {}) for row in record['positions']]
+        for number, position_form in enumerate(position_forms):
+            if not position_form.is_valid():
+                errors['position {}'.format(number + 1)] = [
+                    '{}: {}'.format(field, message)
+                    for field, messages in position_form.errors.items() for message in messages]
+        if errors:
+            self.reject(record, {field: list(messages) for field, messages in errors.items()})
+            return None
+
+        project = project_form.save(commit=False)
+        project.user_id = owner_id
+        positions = [models.Position(name=form.cleaned_data['name'],
+                                     descript=form.cleaned_data.get('descript'),
+                                     skill=form.cleaned_data.get('skill'),
+                                     status=choices.OPEN)
+                     for form in position_forms]
+        return project, positions
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            entry = self.validate(record)
+            if entry is not None:
+                batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        return self
+
+    def write(self, batch):
+        for attempt in range(ID_ATTEMPTS):
+            try:
+                self.write_batch(batch)
+                break
+            except IntegrityError:
+                # Another writer took the ids we allocated; allocate again
+                if attempt == ID_ATTEMPTS - 1:
+                    raise
+        self.projects += len(batch)
+        self.positions += sum(len(positions) for project, positions in batch)
+        if self.progress:
+            self.progress(self)
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        projects = [project for project, positions in batch]
+        allocate_ids(projects)
+        models.Project.objects.bulk_create(projects)
+
+        Tagging = models.Project.skill_tags.through
+        Tagging.objects.bulk_create(
+            Tagging(project_id=project.id, skilltag_id=tag_id)
+            for project in projects for tag_id in self.tag_ids(project.skill_needs))
+        search.index_projects(projects)
+
+        for project, positions in batch:
+            for position in positions:
+                position.project_id = project.id
+        # Updates facets, the match matrix and the listing version
+        models.Position.objects.bulk_create(
+            [position for project, positions in batch for position in positions], batch_size=self.batch_size)
+        caching.bump_projects_version()
+
+    def tag_ids(self, skill_needs):
+        if skill_needs not in self.tags:
+            self.tags[skill_needs] = list(models.SkillTag.objects.in_text(skill_needs).values_list('id', flat=True))
+        return self.tags[skill_needs]
+
+
+def allocate_ids(projects):
+    """
+    Number new projects ourselves where the database cannot return the ids
+    of bulk inserted rows (SQLite), so their positions can point at them
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return
+    for project_id, project in enumerate(projects, start=last_project_id() + 1):
+        project.id = project_id
+
+
+def last_project_id():
+    """
+    The highest project id ever handed out. On SQLite that is the
+    AUTOINCREMENT counter, so ids of deleted or purged projects, which
+    caches and the search index may still hold, are never reused
+    """
+    table = models.Project._meta.db_table
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            row = cursor.fetchone()
+        return row[0] if row else 0
+    # Soft-deleted projects still hold their ids
+    return models.Project.all_objects.aggregate(last_id=Max('id'))['last_id'] or 0
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import benchmark
+from accounts import models
+
+
+class Command(BaseCommand):
+    help = "Request every page in accounts/urls.py and report p50/p95 latency and query counts as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=benchmark.ITERATIONS,
+                            help="Timed requests per URL, after one warm-up request")
+        parser.add_argument('--username',
+                            help="User to browse as; defaults to the owner of the first application")
+        parser.add_argument('--output', help="Write the report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = models.User.objects.filter(username=options['username']).first()
+        else:
+            user = benchmark.benchmark_user()
+        if user is None or not models.Application.objects.filter(position__project__user=user).exists():
+            raise CommandError("Nothing to benchmark: run manage.py seed first")
+
+        report = json.dumps(benchmark.run(user, options['iterations']), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from accounts import assets
+
+
+class Command(BaseCommand):
+    help = "Build the CSS/JS bundles, then collect static files with hashed names and precompressed copies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-collect', action='store_true', help="Only build the bundles")
+
+    def handle(self, *args, **options):
+        for name, size in sorted(assets.build_bundles(settings.ASSETS_BUILD_DIR).items()):
+            self.stdout.write("Built {} ({} bytes)".format(name, size))
+        if not options['no_collect']:
+            if settings.ASSETS_BUILD_DIR not in settings.STATICFILES_DIRS:
+                # On a clean checkout the build directory did not exist yet when
+                # the settings were read; collect the bundles just written too
+                settings.STATICFILES_DIRS = [*settings.STATICFILES_DIRS, settings.ASSETS_BUILD_DIR]
+                finders.get_finder.cache_clear()
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts import notifications
+
+
+class Command(BaseCommand):
+    help = ("Combine the pending decisions of each digest subscriber into one email and send "
+            "the outbox over one mail connection; run once a day")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-send', action='store_true',
+                            help="Only queue the digests; send_outbox delivers them later")
+
+    def handle(self, *args, **options):
+        digests = notifications.build_digests()
+        self.stdout.write("Queued {} digest(s)".format(digests))
+        if not options['no_send']:
+            sent, failed = notifications.drain_outbox()
+            self.stdout.write("Sent {} message(s), {} failed".format(sent, failed))
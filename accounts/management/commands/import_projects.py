@@ -0,0 +1,58 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import importing
+from accounts import models
+
+
+class Command(BaseCommand):
+    help = "Import projects and their positions from a CSV or JSON file, validated like the project form"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .csv or .json file; see accounts/importing.py for the layout")
+        parser.add_argument('--owner', help="Username owning projects that do not name an owner")
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help="Input format; guessed from the file extension by default")
+        parser.add_argument('--batch-size', type=int, default=importing.BATCH_SIZE,
+                            help="Projects written per transaction")
+        parser.add_argument('--rejects', help="Write rejected projects to this file as JSON lines")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = models.User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError("No user named {!r}".format(options['owner']))
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError("Cannot tell the format of {}; pass --format".format(options['path']))
+
+        started = time.monotonic()
+
+        def progress(importer):
+            self.stdout.write("{} projects, {} positions imported, {} rejected ({:.0f} rows/s)".format(
+                importer.projects, importer.positions, len(importer.rejects),
+                (importer.projects + importer.positions) / max(time.monotonic() - started, 1e-6)))
+
+        importer = importing.ProjectImporter(default_owner=owner, batch_size=options['batch_size'],
+                                             progress=progress)
+        with open(options['path'], newline='', encoding='utf-8') as source:
+            try:
+                records = importing.read_csv(source) if file_format == 'csv' else importing.read_json(source)
+                importer.run(records)
+            except (ValueError, csv.Error) as error:
+                raise CommandError("Could not read {}: {}".format(options['path'], error))
+
+        if options['rejects']:
+            with open(options['rejects'], 'w') as output:
+                for reject in importer.rejects:
+                    output.write(json.dumps(reject) + '\n')
+        else:
+            for reject in importer.rejects:
+                self.stderr.write("Line {line} ({title}): {errors}".format(**reject))
+        self.stdout.write(self.style.SUCCESS("Imported {} projects with {} positions, {} rejected".format(
+            importer.projects, importer.positions, len(importer.rejects))))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import avatars
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails of newly uploaded avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Process at most this many profiles per pass")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new uploads instead of exiting")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = avatars.process_pending(limit=options['limit'])
+            if processed or not options['loop']:
+                self.stdout.write("Processed {} avatar(s)".format(processed))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import deletion
+
+
+class Command(BaseCommand):
+    help = "Remove the rows of soft-deleted projects in small batches, each in its own transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=deletion.PURGE_BATCH_SIZE,
+                            help="Rows deleted per DELETE statement and transaction")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches, so other writers get the database")
+        parser.add_argument('--older-than', type=float, default=0.0,
+                            help="Only purge projects deleted at least this many hours ago")
+
+    def handle(self, *args, **options):
+        before = None
+        if options['older_than']:
+            before = timezone.now() - timedelta(hours=options['older_than'])
+        counts = deletion.purge_deleted(batch_size=options['batch_size'], pause=options['pause'], before=before)
+        if not counts:
+            self.stdout.write("Nothing to purge")
+        for label, count in sorted(counts.items()):
+            self.stdout.write("Deleted {} {} row(s)".format(count, label))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts import models
+
+
+class Command(BaseCommand):
+    help = "Recount undecided, approved and denied applications per position and per project owner"
+
+    def handle(self, *args, **options):
+        models.rebuild_application_counts()
+        self.stdout.write(self.style.SUCCESS("Application counts rebuilt"))
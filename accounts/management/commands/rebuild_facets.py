@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts import models
+
+
+class Command(BaseCommand):
+    help = "Recount the open positions per skill shown in the Project Needs sidebar"
+
+    def handle(self, *args, **options):
+        models.SkillFacet.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS("Skill facets rebuilt"))
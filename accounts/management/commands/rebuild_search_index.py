@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text project search index from the project table"
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("The search index requires an SQLite database")
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
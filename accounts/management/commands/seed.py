@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from accounts import seeding
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate synthetic users, skills, projects, positions and applications for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--skills-per-user', type=int, default=3)
+        parser.add_argument('--projects-per-user', type=int, default=2)
+        parser.add_argument('--positions-per-project', type=int, default=3)
+        parser.add_argument('--applications-per-user', type=int, default=5)
+        parser.add_argument('--prefix', default='seed',
+                            help="Username prefix; seeded users log in as <prefix><n>@example.com")
+        parser.add_argument('--random-seed', type=int, default=0,
+                            help="Seed for the random generator, so runs are reproducible")
+
+    def handle(self, *args, **options):
+        counts = seeding.seed(
+            users=options['users'],
+            skills_per_user=options['skills_per_user'],
+            projects_per_user=options['projects_per_user'],
+            positions_per_project=options['positions_per_project'],
+            applications_per_user=options['applications_per_user'],
+            prefix=options['prefix'],
+            random_seed=options['random_seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Created " + ", ".join("{} {}".format(count, name) for name, count in counts.items())))
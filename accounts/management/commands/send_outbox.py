@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import notifications
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notification emails in batches over one mail connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=notifications.BATCH_SIZE,
+                            help="Messages claimed from the outbox at a time")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling the outbox instead of exiting once it is drained")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = notifications.drain_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write("Sent {} message(s), {} failed".format(sent, failed))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,236 @@
+"""
+"Positions for me": rank open positions against a user's skills.
+
+Open positions are encoded once into a weight matrix with one row per
+position and one column per skill tag that open positions or their
+projects use: the position's own skill weighs POSITION_WEIGHT and each
+skill its project needs weighs PROJECT_WEIGHT. Scoring a user is then a
+single matrix-vector product with their skill vector.
+
+Each process keeps its matrix in memory. Position signals, bulk created
+positions and changed project needs patch the local matrix row by row and
+bump a version counter in the shared cache; a process that finds the
+shared version ahead of its own rebuilds.
+"""
+import threading
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS
+
+from . import caching
+from . import choices
+from . import models
+
+
+VERSION_KEY = 'matching:version'
+POSITION_WEIGHT = 2.0
+PROJECT_WEIGHT = 1.0
+RESULT_LIMIT = 10
+# Rows and columns allocated when a matrix first grows
+MIN_CAPACITY = 64
+
+_lock = threading.RLock()
+_matrix = None
+
+
+class PositionMatrix:
+    def __init__(self, version, tag_ids=(), capacity=0):
+        self.version = version
+        self.columns = {tag_id: column for column, tag_id in enumerate(tag_ids)}
+        # Rows and columns are allocated ahead and doubled when full, so
+        # adding a position or tag copies the matrix only now and then;
+        # size is the number of rows in use
+        self.size = 0
+        self.position_ids = np.zeros(capacity, dtype=np.int64)
+        self.owner_ids = np.zeros(capacity, dtype=np.int64)
+        self.weights = np.zeros((capacity, len(self.columns)), dtype=np.float32)
+        self.rows = {}
+
+    @classmethod
+    def build(cls, version):
+        # Always from the primary: the matrix is kept under the current shared
+        # version, so one built from a lagging replica would outlive the lag
+        positions = list(models.Position.objects.using(DEFAULT_DB_ALIAS).filter(status=choices.OPEN)
+                         .values_list('id', 'tag_id', 'project_id', 'project__user_id'))
+        project_tags = project_tag_ids({position[2] for position in positions})
+
+        # Only tags some open position scores on get a column
+        tag_ids = {position[1] for position in positions if position[1]}
+        for tags in project_tags.values():
+            tag_ids.update(tags)
+        matrix = cls(version, sorted(tag_ids), capacity=len(positions))
+        for position_id, tag_id, project_id, owner_id in positions:
+            matrix.upsert(position_id, tag_id, owner_id, project_tags.get(project_id, ()))
+        return matrix
+
+    def _reserve(self, rows, columns):
+        capacity, width = self.weights.shape
+        if rows <= capacity and columns <= width:
+            return
+        if rows > capacity:
+            capacity = max(rows, 2 * capacity, MIN_CAPACITY)
+            self.position_ids = np.concatenate([self.position_ids[:self.size],
+                                                np.zeros(capacity - self.size, dtype=np.int64)])
+            self.owner_ids = np.concatenate([self.owner_ids[:self.size],
+                                             np.zeros(capacity - self.size, dtype=np.int64)])
+        if columns > width:
+            width = max(columns, 2 * width, MIN_CAPACITY)
+        weights = np.zeros((capacity, width), dtype=np.float32)
+        weights[:self.size, :self.weights.shape[1]] = self.weights[:self.size]
+        self.weights = weights
+
+    def _column(self, tag_id):
+        if tag_id not in self.columns:
+            self._reserve(self.size, len(self.columns) + 1)
+            self.columns[tag_id] = len(self.columns)
+        return self.columns[tag_id]
+
+    def _fill(self, row, tag_id, project_tag_ids):
+        # Columns first: adding one may replace self.weights
+        weighted = [(self._column(project_tag_id), PROJECT_WEIGHT) for project_tag_id in project_tag_ids]
+        if tag_id:
+            weighted.append((self._column(tag_id), POSITION_WEIGHT))
+        self.weights[row] = 0
+        for column, weight in weighted:
+            self.weights[row, column] += weight
+
+    def upsert(self, position_id, tag_id, owner_id, project_tag_ids):
+        row = self.rows.get(position_id)
+        if row is None:
+            self._reserve(self.size + 1, len(self.columns))
+            row = self.size
+            self.size += 1
+            self.rows[position_id] = row
+            self.position_ids[row] = position_id
+            self.owner_ids[row] = owner_id
+        self._fill(row, tag_id, project_tag_ids)
+
+    def remove(self, position_id):
+        row = self.rows.pop(position_id, None)
+        if row is not None:
+            # Leave a zeroed row behind; it never scores and goes away on the next rebuild
+            self.weights[row] = 0
+            self.position_ids[row] = 0
+
+    def score(self, tag_ids, exclude_owner=None, exclude_positions=(), limit=RESULT_LIMIT):
+        """Best (position id, score) pairs for someone with the given skills"""
+        position_ids = self.position_ids[:self.size]
+        vector = np.zeros(self.weights.shape[1], dtype=np.float32)
+        for tag_id in tag_ids:
+            if tag_id in self.columns:
+                vector[self.columns[tag_id]] = 1
+        scores = self.weights[:self.size].dot(vector)
+        if exclude_owner is not None:
+            scores[self.owner_ids[:self.size] == exclude_owner] = 0
+        if exclude_positions:
+            scores[np.isin(position_ids, list(exclude_positions))] = 0
+
+        matched = np.count_nonzero(scores)
+        limit = min(limit, matched)
+        if not limit:
+            return []
+        # Every row tied with the limit-th best score is a candidate, so ties
+        # are broken by position id rather than by where the partition put them
+        cutoff = -np.partition(-scores, limit - 1)[limit - 1]
+        best = np.flatnonzero(scores >= cutoff)
+        # Highest score first, older positions first on ties
+        best = best[np.lexsort((position_ids[best], -scores[best]))][:limit]
+        return [(int(position_ids[row]), float(scores[row])) for row in best]
+
+
+def shared_version():
+    return caching.get_version(VERSION_KEY)
+
+
+def get_matrix():
+    """This process' matrix, rebuilt if another process changed positions since it was built"""
+    global _matrix
+    version = shared_version()
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = PositionMatrix.build(version)
+        return _matrix
+
+
+def _local_version():
+    """Version of this process' matrix if it has seen every change so far, else None"""
+    if _matrix is not None and _matrix.version == shared_version():
+        return _matrix.version
+    return None
+
+
+def _bump(local_version):
+    """Bump the shared version; the local matrix stays valid only if nobody else changed positions"""
+    version = caching.bump_version(VERSION_KEY)
+    if _matrix is not None:
+        current = local_version is not None and version == local_version + 1
+        _matrix.version = version if current else None
+
+
+def project_tag_ids(project_ids):
+    """{project id: [skill tag ids]} with one query"""
+    tags = {}
+    for project_id, tag_id in models.Project.skill_tags.through.objects.using(DEFAULT_DB_ALIAS).filter(
+            project_id__in=project_ids).values_list('project_id', 'skilltag_id'):
+        tags.setdefault(project_id, []).append(tag_id)
+    return tags
+
+
+def position_changed(position):
+    with _lock:
+        local_version = _local_version()
+        if local_version is not None:
+            if position.status == choices.OPEN:
+                project_tag_ids = models.Project.skill_tags.through.objects.filter(
+                    project_id=position.project_id).values_list('skilltag_id', flat=True)
+                _matrix.upsert(position.id, position.tag_id, position.project.user_id, list(project_tag_ids))
+            else:
+                _matrix.remove(position.id)
+        _bump(local_version)
+
+
+def projects_changed(project_ids):
+    """
+    Re-fill the rows of every open position of these projects, with two
+    queries: after bulk created positions (whose ids SQLite does not return)
+    or a change to a project's skill needs
+    """
+    with _lock:
+        local_version = _local_version()
+        if local_version is not None:
+            tags = project_tag_ids(project_ids)
+            positions = models.Position.all_objects.using(DEFAULT_DB_ALIAS).filter(
+                project_id__in=project_ids, status=choices.OPEN).values_list(
+                'id', 'tag_id', 'project_id', 'project__user_id')
+            for position_id, tag_id, project_id, owner_id in positions:
+                _matrix.upsert(position_id, tag_id, owner_id, tags.get(project_id, ()))
+        _bump(local_version)
+
+
+def position_removed(position):
+    with _lock:
+        local_version = _local_version()
+        if local_version is not None:
+            _matrix.remove(position.id)
+        _bump(local_version)
+
+
+def invalidate():
+    """Something other than a single position changed: every process rebuilds"""
+    with _lock:
+        _bump(None)
+
+
+def recommend(user, tag_ids, limit=RESULT_LIMIT):
+    """Open positions for a user, best match first, each with a match_score attribute"""
+    applied = set(models.Application.objects.filter(user__user=user).values_list('position_id', flat=True))
+    scored = get_matrix().score(tag_ids, exclude_owner=user.id, exclude_positions=applied, limit=limit)
+    positions = models.Position.objects.select_related('project').in_bulk(
+        [position_id for position_id, score in scored])
+    recommendations = []
+    for position_id, score in scored:
+        if position_id in positions:
+            position = positions[position_id]
+            position.match_score = score
+            recommendations.append(position)
+    return recommendations
@@ -0,0 +1,136 @@
+"""
+Uploaded media, served to signed in users only.
+
+serve() checks access and answers conditional requests (If-None-Match,
+If-Modified-Since) itself from a stat() of the file. With MEDIA_ACCEL set,
+the body is then sent by the front-end server:
+
+    'nginx'   X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path, for an internal
+              location aliased to MEDIA_ROOT
+    'apache'  X-Sendfile with the absolute path (mod_xsendfile)
+
+Both handle Range requests themselves. Without MEDIA_ACCEL, for local runs,
+the file is streamed by Django, including single byte ranges.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+
+# Top level MEDIA_ROOT directories that may be served
+MEDIA_DIRECTORIES = ('avatars',)
+CACHE_CONTROL = 'private, max-age=3600'
+CHUNK_SIZE = 64 * 1024
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_access(user, path):
+    return user.is_authenticated and path.split('/', 1)[0] in MEDIA_DIRECTORIES
+
+
+def file_etag(stat):
+    return quote_etag('{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+
+def byte_range(header, size):
+    """(start, end) of a single satisfiable range, None to send everything, or False if unsatisfiable"""
+    match = BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        # Several ranges or a malformed header: a full response is allowed
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def accelerated(path, full_path):
+    mode = getattr(settings, 'MEDIA_ACCEL', '')
+    if mode == 'nginx':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        return response
+    if mode == 'apache':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+        return response
+    return None
+
+
+def streamed(request, full_path, size, etag):
+    start, end = 0, size - 1
+    status = 200
+    header = request.META.get('HTTP_RANGE')
+    # If-Range: only send part of the file if it is still the version the client has
+    if header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        requested = byte_range(header, size)
+        if requested is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+        if requested:
+            (start, end), status = requested, 206
+
+    response = StreamingHttpResponse(read_range(full_path, start, end - start + 1), status=status)
+    response['Content-Length'] = end - start + 1
+    if status == 206:
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """A file under MEDIA_ROOT, or 304 Not Modified if the client's copy is current"""
+    # Resolve '..' before checking which directory the file is in
+    path = posixpath.normpath(path).lstrip('/')
+    if not can_access(request.user, path):
+        if not request.user.is_authenticated:
+            raise PermissionDenied
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    stat = os.stat(full_path)
+
+    etag = file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = accelerated(path, full_path)
+        if response is None:
+            response = streamed(request, full_path, stat.st_size, etag)
+        response['Content-Type'] = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
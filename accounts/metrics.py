@@ -0,0 +1,211 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware records, per URL name, the request latency, the number
+and total time of SQL queries and the response size into in-process
+histograms. Recording is a few dictionary and list operations under a
+lock, so it costs microseconds per request.
+
+With several worker processes, set METRICS_DIR to a directory shared by
+the workers (and emptied when the server starts). Each process then
+writes a snapshot of its metrics there at most once per FLUSH_INTERVAL,
+and the /metrics view adds up the snapshots of every process. Without
+METRICS_DIR, /metrics reports the process that serves it.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+PREFIX = 'soc_'
+FLUSH_INTERVAL = 1.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Metric:
+    def __init__(self, name, documentation, labels):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def empty(self):
+        """Same metric without any values"""
+        metric = copy.copy(self)
+        metric.values = {}
+        return metric
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, labels, value):
+        self.inc(labels, value)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, self.labels, labels, value
+
+
+class Histogram(Metric):
+    """Values are the bucket counts followed by the sum of the observations"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def merge(self, labels, value):
+        counts = self.values.get(labels)
+        if counts is None:
+            self.values[labels] = list(value)
+        else:
+            for index, count in enumerate(value):
+                counts[index] += count
+
+    def samples(self):
+        bounds = [repr(float(bucket)) for bucket in self.buckets] + ['+Inf']
+        for labels, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield self.name + '_bucket', self.labels + ('le',), labels + (bound,), cumulative
+            yield self.name + '_sum', self.labels, labels, counts[-1]
+            yield self.name + '_count', self.labels, labels, cumulative
+
+
+REQUESTS = Counter('http_requests_total', "Requests served", ('view', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', "Time spent in Django per request",
+                    ('view',), LATENCY_BUCKETS)
+QUERIES = Histogram('db_queries_per_request', "SQL queries executed per request", ('view',), QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram('db_duration_seconds', "Time spent in SQL per request", ('view',), LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', "Response body size, streaming responses excluded",
+                          ('view',), SIZE_BUCKETS)
+
+METRICS = (REQUESTS, LATENCY, QUERIES, DB_TIME, RESPONSE_SIZE)
+
+_lock = threading.Lock()
+_last_flush = 0.0
+_started = int(time.time())
+
+
+class QueryTimer:
+    """connection.execute_wrapper() callable counting and timing queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def observe_request(view, method, status, duration, queries, db_duration, size=None):
+    with _lock:
+        REQUESTS.inc((view, method, str(status)))
+        LATENCY.observe((view,), duration)
+        QUERIES.observe((view,), queries)
+        DB_TIME.observe((view,), db_duration)
+        if size is not None:
+            RESPONSE_SIZE.observe((view,), size)
+    if metrics_dir() and time.monotonic() - _last_flush > FLUSH_INTERVAL:
+        flush()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def snapshot_path():
+    return os.path.join(metrics_dir(), 'metrics-{}-{}.json'.format(os.getpid(), _started))
+
+
+def snapshot():
+    with _lock:
+        return {metric.name: [[list(labels), value] for labels, value in metric.values.items()]
+                for metric in METRICS}
+
+
+def flush():
+    """Write this process' snapshot where the other workers' /metrics can read it"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    path = snapshot_path()
+    temporary = '{}.{}.tmp'.format(path, threading.get_ident())
+    os.makedirs(metrics_dir(), exist_ok=True)
+    with open(temporary, 'w') as output:
+        json.dump(snapshot(), output)
+    os.replace(temporary, path)
+
+
+def _flush_on_exit():
+    if metrics_dir():
+        flush()
+
+
+atexit.register(_flush_on_exit)
+
+
+def collect():
+    """Metrics of every process that wrote a snapshot, or of this process alone"""
+    directory = metrics_dir()
+    if not directory:
+        snapshots = [snapshot()]
+    else:
+        flush()
+        snapshots = []
+        for filename in os.listdir(directory):
+            if filename.startswith('metrics-') and filename.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, filename)) as source:
+                        snapshots.append(json.load(source))
+                except (OSError, ValueError):
+                    # Removed or half-written by its process meanwhile
+                    continue
+
+    merged = [metric.empty() for metric in METRICS]
+    for metric in merged:
+        for data in snapshots:
+            for labels, value in data.get(metric.name, ()):
+                metric.merge(tuple(labels), value)
+    return merged
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def render(metrics):
+    lines = []
+    for metric in metrics:
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+        for name, label_names, labels, value in metric.samples():
+            pairs = ','.join('{}="{}"'.format(key, escape(label)) for key, label in zip(label_names, labels))
+            lines.append('{}{{{}}} {}'.format(name, pairs, value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,70 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import identity
+from . import metrics
+from . import routers
+
+
+class MetricsMiddleware:
+    """Record latency, SQL queries and response size per URL name; see accounts.metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = metrics.QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match and match.url_name else 'unnamed'
+        size = None if response.streaming else len(response.content)
+        metrics.observe_request(view, request.method, response.status_code, duration,
+                                timer.count, timer.duration, size)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Serve reads of @replica_reads views from the replicas, and pin a session
+    that wrote to the primary for REPLICA_PIN_SECONDS; see accounts.routers.
+    Goes after SessionMiddleware, so the pin is saved with the session.
+    """
+    PIN_KEY = '_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                request.session[self.PIN_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+        finally:
+            routers.reset()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD') and routers.reads_from_replicas(view_func)
+                and request.session.get(self.PIN_KEY, 0) < time.time()):
+            routers.use_replicas()
+
+
+class IdentityMiddleware:
+    """Attach a lazily loaded accounts.identity.Identity as request.identity"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.identity = identity.Identity(request.user)
+        return self.get_response(request)
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from accounts import search
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        search.create_index(cursor)
+        cursor.execute(
+            "INSERT INTO {}(rowid, title, description) "
+            "SELECT id, title, COALESCE(description, '') FROM accounts_project".format(search.INDEX_TABLE))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        search.drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_auto_20190115_1033'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.1.15 on 2026-10-18 08:39
+
+import accounts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(default='avatars/default_avatar.png', storage=accounts.storage.ContentAddressedStorage(), upload_to='avatars'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+import re
+
+from django.db import migrations
+from django.utils.text import slugify
+
+from accounts import choices
+
+
+def seed_skill_tags(apps, schema_editor):
+    SkillTag = apps.get_model('accounts', 'SkillTag')
+    Skill = apps.get_model('accounts', 'Skill')
+    Position = apps.get_model('accounts', 'Position')
+    Project = apps.get_model('accounts', 'Project')
+
+    tags = {}
+
+    def tag_for(name):
+        slug = slugify(name or '')
+        if not slug:
+            return None
+        if slug not in tags:
+            tags[slug], created = SkillTag.objects.get_or_create(slug=slug, defaults={'name': name})
+        return tags[slug]
+
+    for value, label in choices.SKILLS:
+        tag_for(label)
+
+    for skill in Skill.objects.all():
+        skill.tag = tag_for(skill.name)
+        skill.save(update_fields=['tag'])
+
+    for position in Position.objects.all():
+        position.tag = tag_for(position.skill)
+        position.save(update_fields=['tag'])
+
+    # Free-text project needs only map onto tags that already exist
+    for project in Project.objects.exclude(skill_needs=None):
+        slugs = {slugify(word) for word in re.split(r'[\s,;/]+', project.skill_needs)}
+        project.skill_tags.set([tags[slug] for slug in slugs if slug in tags])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_skilltag'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_skill_tags, migrations.RunPython.noop),
+    ]
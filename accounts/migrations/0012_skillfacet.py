@@ -0,0 +1,34 @@
+# Generated by Django 2.1.15 on 2026-10-18 08:41
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_open_positions(apps, schema_editor):
+    SkillTag = apps.get_model('accounts', 'SkillTag')
+    SkillFacet = apps.get_model('accounts', 'SkillFacet')
+    Position = apps.get_model('accounts', 'Position')
+    counts = dict(Position.objects.filter(status='open', tag__isnull=False)
+                  .values_list('tag').annotate(Count('id')).order_by())
+    SkillFacet.objects.bulk_create(SkillFacet(tag_id=tag_id, open_positions=counts.get(tag_id, 0))
+                                   for tag_id in SkillTag.objects.values_list('id', flat=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_seed_skill_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_positions', models.PositiveIntegerField(default=0)),
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='facet', to='accounts.SkillTag')),
+            ],
+        ),
+        migrations.RunPython(count_open_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.1.15 on 2026-10-18 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_applications(apps, schema_editor):
+    Application = apps.get_model('accounts', 'Application')
+    OwnerApplicationCounts = apps.get_model('accounts', 'OwnerApplicationCounts')
+    PositionApplicationCounts = apps.get_model('accounts', 'PositionApplicationCounts')
+    statuses = ('undecided', 'approved', 'denied')
+
+    for Counts, key, field in ((PositionApplicationCounts, 'position_id', 'position'),
+                               (OwnerApplicationCounts, 'owner_id', 'position__project__user')):
+        rows = {}
+        for key_id, status, count in (Application.objects.filter(status__in=statuses)
+                                      .values_list(field, 'status').annotate(Count('id')).order_by()):
+            rows.setdefault(key_id, {})[status] = count
+        Counts.objects.bulk_create(Counts(**{key: key_id}, **counts) for key_id, counts in rows.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0012_skillfacet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerApplicationCounts',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('undecided', models.PositiveIntegerField(default=0)),
+                ('approved', models.PositiveIntegerField(default=0)),
+                ('denied', models.PositiveIntegerField(default=0)),
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='application_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'owner application counts',
+            },
+        ),
+        migrations.CreateModel(
+            name='PositionApplicationCounts',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('undecided', models.PositiveIntegerField(default=0)),
+                ('approved', models.PositiveIntegerField(default=0)),
+                ('denied', models.PositiveIntegerField(default=0)),
+                ('position', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='application_counts', to='accounts.Position')),
+            ],
+            options={
+                'verbose_name_plural': 'position application counts',
+            },
+        ),
+        migrations.RunPython(count_applications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_project_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_events', to='accounts.Application')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='notification_mode',
+            field=models.CharField(choices=[('immediate', 'Email me about each decision'), ('digest', 'Send me one daily digest')], default='immediate', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='digestevent',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_events', to='accounts.Profile'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_digest_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='skillfacet',
+            name='open_positions',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_skillfacet_open_positions_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='claim',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,8 +1,22 @@
-from django.db import models
-from django.db.models.signals import post_save
+import re
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.text import slugify
+from django.db.models.signals import pre_save, post_init, post_save, post_delete
 from django.contrib.auth.models import User
 from django.core.validators import EmailValidator, MinLengthValidator
 
+from . import caching
+from . import choices
+from . import identity
+from . import matching
+from . import readmodels
+from . import search
+from .storage import ContentAddressedStorage
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -10,7 +24,16 @@ class Profile(models.Model):
     last_name = models.CharField(max_length=100, blank=True)
     email = models.EmailField(validators=[EmailValidator])
     bio = models.TextField(blank=True, validators=[MinLengthValidator(10)])
-    avatar = models.ImageField(upload_to="avatars", default="avatars/default_avatar.png")
+    avatar = models.ImageField(upload_to="avatars", storage=ContentAddressedStorage(),
+                               default="avatars/default_avatar.png")
+    # Set once process_avatars has rendered the thumbnails of the current avatar
+    avatar_processed = models.BooleanField(default=False)
+    # How application decisions are emailed; see notifications.queue_decisions()
+    notification_mode = models.CharField(max_length=20, choices=choices.NOTIFICATION_MODES,
+                                         default=choices.IMMEDIATE)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Also touched when the user's skills change
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
 
 def create_profile(sender,**kwargs ):
@@ -21,6 +44,58 @@ def create_profile(sender,**kwargs ):
 post_save.connect(create_profile, sender=User)
 
 
+def refresh_owner_cards(sender, instance, raw=False, **kwargs):
+    if not raw:
+        readmodels.refresh_owner_cards(instance.user_id)
+
+
+post_save.connect(refresh_owner_cards, sender=Profile)
+
+
+def forget_identity(sender, instance, raw=False, **kwargs):
+    if not raw:
+        identity.invalidate([instance.user_id])
+
+
+post_save.connect(forget_identity, sender=Profile)
+post_delete.connect(forget_identity, sender=Profile)
+
+
+class SkillTagManager(models.Manager):
+    def for_name(self, name):
+        """Canonical tag for a skill name, created on first use"""
+        slug = slugify(name or '')
+        if not slug:
+            return None
+        tag, created = self.get_or_create(slug=slug, defaults={'name': name})
+        return tag
+
+    def in_text(self, text):
+        """Existing tags named in free text such as "Python, Django" """
+        slugs = {slugify(word) for word in re.split(r'[\s,;/]+', text or '')}
+        slugs.discard('')
+        return self.filter(slug__in=slugs)
+
+
+class SkillTag(models.Model):
+    """Canonical skill shared by user skills, positions and project needs"""
+    name = models.CharField(max_length=200, unique=True)
+    slug = models.SlugField(max_length=200, unique=True)
+
+    objects = SkillTagManager()
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class ProjectManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Project(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
@@ -29,34 +104,257 @@ class Project(models.Model):
     timeline = models.CharField(max_length=200, null=True)
     requirements = models.TextField(null=True)
     skill_needs = models.CharField(max_length=200, null=True)
+    skill_tags = models.ManyToManyField(SkillTag, blank=True, related_name='projects')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Also touched when any of its positions change
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # Set by deletion.soft_delete_project(); purge_deleted_projects removes the rows later
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    # Projects, positions and applications of deleted projects are hidden;
+    # all_objects includes them
+    objects = ProjectManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
 
 
+def update_search_index(sender, instance, **kwargs):
+    search.index_project(instance)
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_project(instance.pk)
+
+
+def tag_project(sender, instance, raw=False, **kwargs):
+    tag_ids = set(SkillTag.objects.in_text(instance.skill_needs).values_list('id', flat=True))
+    if tag_ids != set(instance.skill_tags.values_list('id', flat=True)):
+        instance.skill_tags.set(tag_ids)
+        if not raw:
+            # Project needs feed into the match score of the project's positions
+            matching.projects_changed([instance.pk])
+
+
+post_save.connect(update_search_index, sender=Project)
+post_save.connect(tag_project, sender=Project)
+post_delete.connect(remove_from_search_index, sender=Project)
+
+
 class Skill(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
+    tag = models.ForeignKey(SkillTag, null=True, blank=True, on_delete=models.SET_NULL, related_name='skills')
 
     def __str__(self):
         return self.name
 
 
+def tag_skill(sender, instance, **kwargs):
+    instance.tag = SkillTag.objects.for_name(instance.name)
+
+
+def touch_profile(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Profile.objects.filter(user_id=instance.user_id).update(updated=timezone.now())
+
+
+pre_save.connect(tag_skill, sender=Skill)
+post_save.connect(touch_profile, sender=Skill)
+post_delete.connect(touch_profile, sender=Skill)
+post_save.connect(forget_identity, sender=Skill)
+post_delete.connect(forget_identity, sender=Skill)
+
+
+class PositionManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(project__deleted_at__isnull=True)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create() sends no signals, so do what the Position signals
+        would: tag the positions, count the open ones in the skill facets,
+        add them to the match matrix and invalidate the cached listings
+        """
+        objs = list(objs)
+        tags = {}
+        for position in objs:
+            if position.skill not in tags:
+                tags[position.skill] = SkillTag.objects.for_name(position.skill)
+            position.tag = tags[position.skill]
+        created = super().bulk_create(objs, *args, **kwargs)
+
+        deltas = Counter()
+        for position in created:
+            position._facet_tag = open_tag(position.tag_id, position.status)
+            if position._facet_tag:
+                deltas[position._facet_tag] += 1
+        SkillFacet.objects.adjust(deltas)
+        matching.projects_changed({position.project_id for position in created})
+        caching.bump_projects_version()
+        touch_projects({position.project_id for position in created})
+        readmodels.refresh_project_cards(position.project_id for position in created)
+        return created
+
+
 class Position(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     descript = models.CharField(max_length=500, null=True)
     skill = models.CharField(max_length=200, null=True)
+    tag = models.ForeignKey(SkillTag, null=True, blank=True, on_delete=models.SET_NULL, related_name='positions')
     status = models.CharField(max_length=100, default="open")
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = PositionManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
 
 
+def tag_position(sender, instance, **kwargs):
+    instance.tag = SkillTag.objects.for_name(instance.skill)
+
+
+pre_save.connect(tag_position, sender=Position)
+
+
+class SkillFacetManager(models.Manager):
+    def sidebar(self):
+        """Skills with open positions; tags only used by profiles or filled positions are left out"""
+        return self.filter(open_positions__gt=0).select_related('tag').order_by('tag__name')
+
+    def adjust(self, deltas):
+        """Apply {tag id: change in open positions}"""
+        for tag_id, delta in deltas.items():
+            if delta:
+                self.filter(tag_id=tag_id).update(open_positions=F('open_positions') + delta)
+
+    def rebuild(self):
+        """Recount open positions per tag from scratch"""
+        counts = dict(Position.objects.filter(status=choices.OPEN, tag__isnull=False)
+                      .values_list('tag').annotate(Count('id')).order_by())
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(SkillFacet(tag_id=tag_id, open_positions=counts.get(tag_id, 0))
+                             for tag_id in SkillTag.objects.values_list('id', flat=True))
+
+
+class SkillFacet(models.Model):
+    """Open positions per skill, kept up to date by Position signals"""
+    tag = models.OneToOneField(SkillTag, on_delete=models.CASCADE, related_name='facet')
+    open_positions = models.PositiveIntegerField(default=0, db_index=True)
+
+    objects = SkillFacetManager()
+
+    def __str__(self):
+        return '{} ({})'.format(self.tag, self.open_positions)
+
+
+def create_skill_facet(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SkillFacet.objects.create(tag=instance)
+
+
+def open_tag(tag_id, status):
+    """The tag a position counts towards, if it is open"""
+    return tag_id if tag_id and status == choices.OPEN else None
+
+
+def remember_facet(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not loaded
+    instance._facet_tag = open_tag(instance.__dict__.get('tag_id'), instance.__dict__.get('status'))
+
+
+def count_position(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_tag = None if created else instance._facet_tag
+    new_tag = open_tag(instance.tag_id, instance.status)
+    if old_tag != new_tag:
+        deltas = {}
+        if old_tag:
+            deltas[old_tag] = -1
+        if new_tag:
+            deltas[new_tag] = deltas.get(new_tag, 0) + 1
+        SkillFacet.objects.adjust(deltas)
+    instance._facet_tag = new_tag
+
+
+def uncount_position(sender, instance, **kwargs):
+    tag_id = open_tag(instance.tag_id, instance.status)
+    # soft_delete_project() already uncounted the positions of deleted projects
+    if tag_id and not Project.all_objects.filter(id=instance.project_id, deleted_at__isnull=False).exists():
+        SkillFacet.objects.adjust({tag_id: -1})
+
+
+def update_position_matrix(sender, instance, raw=False, **kwargs):
+    if not raw:
+        matching.position_changed(instance)
+
+
+def remove_from_position_matrix(sender, instance, **kwargs):
+    matching.position_removed(instance)
+
+
+def touch_projects(project_ids):
+    """Mark projects as changed when their positions change"""
+    Project.objects.filter(id__in=project_ids).update(updated=timezone.now())
+
+
+def touch_project(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_projects([instance.project_id])
+
+
+def bump_projects_version(sender, raw=False, **kwargs):
+    if not raw:
+        caching.bump_projects_version()
+
+
+post_save.connect(create_skill_facet, sender=SkillTag)
+post_init.connect(remember_facet, sender=Position)
+post_save.connect(count_position, sender=Position)
+post_delete.connect(uncount_position, sender=Position)
+post_save.connect(update_position_matrix, sender=Position)
+post_delete.connect(remove_from_position_matrix, sender=Position)
+post_save.connect(touch_project, sender=Position)
+post_delete.connect(touch_project, sender=Position)
+
+
+def refresh_project_card(sender, instance, raw=False, **kwargs):
+    if not raw:
+        project_id = instance.pk if sender is Project else instance.project_id
+        readmodels.refresh_project_cards([project_id])
+
+
+post_save.connect(refresh_project_card, sender=Project)
+post_delete.connect(refresh_project_card, sender=Project)
+post_save.connect(refresh_project_card, sender=Position)
+post_delete.connect(refresh_project_card, sender=Position)
+post_save.connect(bump_projects_version, sender=Project)
+post_delete.connect(bump_projects_version, sender=Project)
+post_save.connect(bump_projects_version, sender=Position)
+post_delete.connect(bump_projects_version, sender=Position)
+
+
+class ApplicationManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(position__project__deleted_at__isnull=True)
+
+
 class Application(models.Model):
     user = models.ForeignKey(Profile, on_delete=models.CASCADE)
     position = models.ForeignKey(Position, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, default="undecided")
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ApplicationManager()
+    all_objects = models.Manager()
 
     class Meta:
         unique_together = ['user', 'position']
@@ -64,3 +362,158 @@ class Application(models.Model):
     def __str__(self):
         return self.position.name
 
+    def save(self, *args, **kwargs):
+        # post_save updates the status counters; keep them in the same transaction as the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ApplicationCountsManager(models.Manager):
+    def adjust(self, deltas, **key):
+        """Apply {status: change} to the counters identified by key, creating them on first use"""
+        changes = {status: delta for status, delta in deltas.items() if delta and status in COUNTED_STATUSES}
+        if not changes:
+            return
+        expressions = {status: F(status) + delta for status, delta in changes.items()}
+        if self.filter(**key).update(**expressions):
+            return
+        if all(delta < 0 for delta in changes.values()):
+            # Nothing to count, and the row may already be gone with what it counts (a cascade delete)
+            return
+        try:
+            with transaction.atomic():
+                self.create(**key, **{status: max(delta, 0) for status, delta in changes.items()})
+        except IntegrityError:
+            # Created concurrently
+            self.filter(**key).update(**expressions)
+
+
+COUNTED_STATUSES = (choices.UNDECIDED, choices.APPROVED, choices.DENIED)
+
+
+class ApplicationCounts(models.Model):
+    """Applications per status, kept up to date by Application signals"""
+    undecided = models.PositiveIntegerField(default=0)
+    approved = models.PositiveIntegerField(default=0)
+    denied = models.PositiveIntegerField(default=0)
+
+    objects = ApplicationCountsManager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total(self):
+        return self.undecided + self.approved + self.denied
+
+
+class OwnerApplicationCounts(ApplicationCounts):
+    """Applications received across all of a user's projects"""
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, related_name='application_counts')
+
+    class Meta:
+        verbose_name_plural = 'owner application counts'
+
+
+class PositionApplicationCounts(ApplicationCounts):
+    position = models.OneToOneField(Position, on_delete=models.CASCADE, related_name='application_counts')
+
+    class Meta:
+        verbose_name_plural = 'position application counts'
+
+
+def count_applications(changes):
+    """Apply {(position id, status): change} to the position and owner counters"""
+    by_position = {}
+    for (position_id, status), delta in changes.items():
+        by_position.setdefault(position_id, Counter())[status] += delta
+    # Also used when projects are deleted, so include hidden positions
+    owners = dict(Position.all_objects.filter(id__in=by_position).values_list('id', 'project__user_id'))
+    by_owner = {}
+    for position_id, deltas in by_position.items():
+        PositionApplicationCounts.objects.adjust(deltas, position_id=position_id)
+        if position_id in owners:
+            by_owner.setdefault(owners[position_id], Counter()).update(deltas)
+    for owner_id, deltas in by_owner.items():
+        OwnerApplicationCounts.objects.adjust(deltas, owner_id=owner_id)
+    # The counts are part of the cached identity, for the nav badge
+    identity.invalidate(by_owner)
+
+
+def rebuild_application_counts():
+    """Recount applications per position and per owner from scratch"""
+    changes = Counter({(position_id, status): count for position_id, status, count in
+                       Application.objects.values_list('position_id', 'status').annotate(Count('id')).order_by()})
+    with transaction.atomic():
+        PositionApplicationCounts.objects.all().delete()
+        OwnerApplicationCounts.objects.all().delete()
+        count_applications(changes)
+
+
+def remember_application(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not loaded
+    if instance.__dict__.get('id') is None:
+        instance._counted = None
+    else:
+        instance._counted = (instance.__dict__.get('position_id'), instance.__dict__.get('status'))
+
+
+def count_application(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._counted
+    new = (instance.position_id, instance.status)
+    if not created and (old is None or None in old):
+        # Loaded with the counted fields deferred: the previous state is unknown
+        return
+    if old != new:
+        changes = Counter({new: 1})
+        if old:
+            changes[old] -= 1
+        count_applications(changes)
+    instance._counted = new
+
+
+def uncount_application(sender, instance, **kwargs):
+    # soft_delete_project() already uncounted the applications of deleted projects
+    deleted = Position.all_objects.filter(id=instance.position_id, project__deleted_at__isnull=False)
+    if not deleted.exists():
+        count_applications({(instance.position_id, instance.status): -1})
+
+
+post_init.connect(remember_application, sender=Application)
+post_save.connect(count_application, sender=Application)
+post_delete.connect(uncount_application, sender=Application)
+
+
+class OutboxMessage(models.Model):
+    """Email waiting to be delivered by the send_outbox command"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.CharField(max_length=254)
+    status = models.CharField(max_length=20, choices=choices.OUTBOX_STATUS, default=choices.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Token of the send_outbox run the message was last handed to; see notifications.claim_messages()
+    claim = models.CharField(max_length=32, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
+
+    def __str__(self):
+        return self.subject
+
+
+class DigestEvent(models.Model):
+    """Application decision waiting for the recipient's next digest, see the build_digests command"""
+    recipient = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='digest_events')
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='digest_events')
+    status = models.CharField(max_length=20)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{} {}'.format(self.application_id, self.status)
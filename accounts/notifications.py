@@ -0,0 +1,216 @@
+"""
+Outbox for application decision emails.
+
+Views only insert OutboxMessage rows, inside the same transaction as the
+change they report on. The send_outbox command delivers them in batches
+over a single mail connection and retries failures with exponential backoff.
+Each batch is claimed with a conditional UPDATE first, so concurrent
+senders never deliver the same message twice; a claim left behind by a
+sender that died expires after CLAIM_TIMEOUT.
+
+Applicants who chose the digest notification mode get a DigestEvent row
+instead. The build_digests command, run daily, turns all pending events of
+each recipient into a single outbox message.
+"""
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import choices
+from . import models
+
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled after every further failure
+RETRY_DELAY = 60
+# Seconds a claimed batch is reserved for its sender
+CLAIM_TIMEOUT = 10 * 60
+
+DECISION_MESSAGES = {
+    choices.APPROVED: "Congratulations!  You've been approved!",
+    choices.DENIED: "Thank you for your interest, but there was someone else we liked better.",
+}
+UNDECIDED_MESSAGE = "Your application is under review"
+
+
+def decision_message(application, sender):
+    """Build the unsaved outbox row telling an applicant about their application's status"""
+    applicant = application.user
+    return models.OutboxMessage(
+        subject="Your application for {}".format(application),
+        body=DECISION_MESSAGES.get(application.status, UNDECIDED_MESSAGE),
+        from_email=sender.email,
+        recipient=recipient_address(applicant),
+    )
+
+
+def recipient_address(profile):
+    return profile.email or profile.user.username
+
+
+def queue_decision(application, sender):
+    """Queue the decision email or digest event; call inside the transaction that saves the status"""
+    queue_decisions([application], sender)
+
+
+def queue_decisions(applications, sender):
+    """Queue decisions with one insert per kind; the applications need user__user loaded"""
+    messages, events = [], []
+    for application in applications:
+        if application.user.notification_mode == choices.DIGEST:
+            events.append(models.DigestEvent(recipient=application.user, application=application,
+                                             status=application.status))
+        else:
+            messages.append(decision_message(application, sender))
+    models.OutboxMessage.objects.bulk_create(messages)
+    models.DigestEvent.objects.bulk_create(events)
+
+
+def digest_message(recipient, events):
+    lines = ["{} ({}): {}".format(event.application.position, event.application.position.project,
+                                  DECISION_MESSAGES.get(event.status, UNDECIDED_MESSAGE))
+             for event in events]
+    return models.OutboxMessage(
+        subject="Your applications: {} update{}".format(len(lines), '' if len(lines) == 1 else 's'),
+        body='\n'.join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient=recipient_address(recipient),
+    )
+
+
+def build_digests():
+    """
+    Queue one outbox message per recipient with pending digest events, read
+    with a single query grouped by recipient, and drop the events. Returns
+    the number of digests queued.
+    """
+    with transaction.atomic():
+        events = list(models.DigestEvent.objects.select_related(
+            'recipient__user', 'application__position__project').order_by('recipient_id', 'id'))
+        if not events:
+            return 0
+        digests = []
+        for recipient_id, recipient_events in groupby(events, key=lambda event: event.recipient_id):
+            recipient_events = [event for event in recipient_events
+                                if event.application.position.project.deleted_at is None]
+            if recipient_events:
+                digests.append(digest_message(recipient_events[0].recipient, recipient_events))
+        models.OutboxMessage.objects.bulk_create(digests)
+        # Only the events read here; any written meanwhile wait for the next digest
+        models.DigestEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(digests)
+
+
+def due_messages(batch_size=BATCH_SIZE, now=None):
+    return list(models.OutboxMessage.objects.filter(
+        status=choices.PENDING,
+        next_attempt__lte=now or timezone.now(),
+    ).order_by('next_attempt', 'id')[:batch_size])
+
+
+def claim_messages(batch_size=BATCH_SIZE, now=None):
+    """
+    Reserve up to batch_size due messages for this sender and return them.
+    Rows another sender claimed between the SELECT and the UPDATE no longer
+    match it and are left out.
+    """
+    now = now or timezone.now()
+    ids = [message.id for message in due_messages(batch_size, now)]
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    models.OutboxMessage.objects.filter(id__in=ids, status=choices.PENDING, next_attempt__lte=now).update(
+        claim=claim, next_attempt=timezone.now() + timedelta(seconds=CLAIM_TIMEOUT))
+    return list(models.OutboxMessage.objects.filter(id__in=ids, claim=claim).order_by('next_attempt', 'id'))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def _to_email(message, connection):
+    return EmailMessage(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or None,
+        to=[message.recipient],
+        connection=connection,
+    )
+
+
+def _mark_sent(batch):
+    models.OutboxMessage.objects.filter(id__in=[message.id for message in batch]).update(
+        status=choices.SENT,
+        sent=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+
+
+def _mark_failed(batch, error):
+    now = timezone.now()
+    with transaction.atomic():
+        for message in batch:
+            message.attempts += 1
+            message.last_error = str(error)
+            if message.attempts >= MAX_ATTEMPTS:
+                message.status = choices.FAILED
+            else:
+                message.next_attempt = now + retry_delay(message.attempts)
+            message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt'])
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        # Nothing more to send over it either way
+        pass
+
+
+def drain_outbox(batch_size=BATCH_SIZE, connection=None):
+    """
+    Send every message that is due over one connection, claiming batch_size
+    at a time. Each message is sent and marked on its own, so a refused
+    address only fails its own message. After a failure the connection is
+    reopened; if it cannot be, the rest of the batch is rescheduled and
+    waits for the next run. Returns (sent, failed) counts.
+    """
+    connection = connection or get_connection()
+    sent = failed = 0
+    now = timezone.now()
+    opened = False
+    try:
+        while True:
+            batch = claim_messages(batch_size, now)
+            if not batch:
+                break
+            for number, message in enumerate(batch):
+                if not opened:
+                    try:
+                        connection.open()
+                    except Exception as error:
+                        _mark_failed(batch[number:], error)
+                        return sent, failed + len(batch) - number
+                    opened = True
+                try:
+                    connection.send_messages([_to_email(message, connection)])
+                except Exception as error:
+                    _mark_failed([message], error)
+                    failed += 1
+                    # The error may have broken the connection; go on with a fresh one
+                    _close(connection)
+                    opened = False
+                else:
+                    _mark_sent([message])
+                    sent += 1
+    finally:
+        if opened:
+            _close(connection)
+    return sent, failed
@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination.
+
+Each page is fetched with "WHERE key after <cursor> ORDER BY key LIMIT n + 1",
+so the cost of a page depends on the page size rather than on how deep
+into the listing it is.
+"""
+from django.utils.functional import cached_property
+
+
+PAGE_SIZE = 25
+
+
+class Page:
+    """
+    One page of rows plus the cursor of the next page.
+    Rows are fetched lazily, on first use.
+    """
+
+    def __init__(self, fetch, page_size, cursor_for):
+        self._fetch = fetch
+        self.page_size = page_size
+        self._cursor_for = cursor_for
+
+    @cached_property
+    def _rows(self):
+        # One extra row tells us whether a next page exists
+        return list(self._fetch(self.page_size + 1))
+
+    @property
+    def object_list(self):
+        return self._rows[:self.page_size]
+
+    @property
+    def has_next(self):
+        return len(self._rows) > self.page_size
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return self._cursor_for(self.object_list[-1])
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def parse_id_cursor(cursor):
+    """Cursors of id-ordered pages are the last id seen"""
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        return None
+
+
+def row_id(row):
+    """Primary key of a model instance or of a values() row"""
+    return row['id'] if isinstance(row, dict) else row.id
+
+
+def keyset_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    """Page through a queryset newest first, ordered by primary key so the order is stable"""
+    after = parse_id_cursor(cursor)
+    queryset = queryset.order_by('-id')
+    if after is not None:
+        queryset = queryset.filter(id__lt=after)
+    return Page(lambda limit: queryset[:limit], page_size, row_id)
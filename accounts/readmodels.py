@@ -0,0 +1,79 @@
+"""
+Precomputed read models kept in the shared cache.
+
+A project card holds everything the project page shows: the project,
+its owner's display name and its positions. Signals rebuild a card
+whenever one of those rows is written, so rendering the page costs one
+cache lookup, plus a single query when the card is missing.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import models
+
+
+CARD_KEY = 'project-card:{}'
+CARD_TIMEOUT = 24 * 60 * 60
+
+CARD_FIELDS = ('id', 'title', 'description', 'timeline', 'requirements', 'skill_needs', 'url', 'user_id', 'updated')
+POSITION_FIELDS = ('id', 'name', 'descript', 'skill', 'status')
+
+
+def card_key(project_id):
+    return CARD_KEY.format(project_id)
+
+
+def build_project_card(project_id):
+    """Read the card from the database with one LEFT JOIN query; None if the project does not exist"""
+    # Always from the primary: a card built from a lagging replica would be cached for a day
+    rows = list(models.Project.objects.using(DEFAULT_DB_ALIAS).filter(id=project_id).values(
+        *CARD_FIELDS,
+        'user__profile__first_name',
+        'user__profile__last_name',
+        'user__profile__updated',
+        *('position__' + field for field in POSITION_FIELDS)
+    ).order_by('position__id'))
+    if not rows:
+        return None
+    card = {field: rows[0][field] for field in CARD_FIELDS}
+    card['owner_name'] = ' '.join(
+        name for name in (rows[0]['user__profile__first_name'], rows[0]['user__profile__last_name']) if name)
+    card['owner_updated'] = rows[0]['user__profile__updated']
+    card['positions'] = [
+        {field: row['position__' + field] for field in POSITION_FIELDS}
+        for row in rows if row['position__id'] is not None
+    ]
+    return card
+
+
+def project_card(project_id):
+    card = cache.get(card_key(project_id))
+    if card is None:
+        card = build_project_card(project_id)
+        if card is not None:
+            cache.set(card_key(project_id), card, CARD_TIMEOUT)
+    return card
+
+
+def _store_project_cards(project_ids):
+    for project_id in project_ids:
+        card = build_project_card(project_id)
+        if card is None:
+            cache.delete(card_key(project_id))
+        else:
+            cache.set(card_key(project_id), card, CARD_TIMEOUT)
+
+
+def refresh_project_cards(project_ids):
+    """
+    Drop the cards now, so nothing stale is served during the transaction,
+    and rebuild them once it commits
+    """
+    project_ids = set(project_ids)
+    cache.delete_many([card_key(project_id) for project_id in project_ids])
+    transaction.on_commit(lambda: _store_project_cards(project_ids))
+
+
+def refresh_owner_cards(user_id):
+    """The owner's display name is on every card of their projects"""
+    refresh_project_cards(models.Project.objects.filter(user_id=user_id).values_list('id', flat=True))
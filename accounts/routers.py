@@ -0,0 +1,70 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary ('default'). Reads go to a replica in
+settings.DATABASE_REPLICAS only while ReplicaMiddleware is serving a GET
+to a view marked with @replica_reads, and only if the session has not
+written anything within the last REPLICA_PIN_SECONDS, so users always
+read their own writes even while replicas lag behind.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Sessions are read before the view runs and must see a login that just happened
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def replica_reads(view):
+    """Mark a view function or class whose reads may be served by a replica"""
+    view.replica_reads = True
+    return view
+
+
+def reads_from_replicas(view_func):
+    return bool(getattr(view_func, 'replica_reads', False)
+                or getattr(getattr(view_func, 'view_class', None), 'replica_reads', False))
+
+
+def use_replicas():
+    """Send this thread's reads to the replicas until reset()"""
+    _state.replica = True
+
+
+def wrote():
+    """Whether this thread wrote to the primary since reset()"""
+    return getattr(_state, 'wrote', False)
+
+
+def reset():
+    _state.replica = False
+    _state.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        if aliases and getattr(_state, 'replica', False) and model._meta.app_label not in PRIMARY_APPS:
+            return random.choice(aliases)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
@@ -0,0 +1,113 @@
+"""Full-text project search backed by an SQLite FTS5 inverted index"""
+import re
+
+from django.db import connection
+
+
+INDEX_TABLE = 'accounts_project_fts'
+RESULT_LIMIT = 50
+
+# Title matches count for more than description matches when ranking
+TITLE_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def is_available():
+    """The FTS5 index only exists on SQLite databases"""
+    return connection.vendor == 'sqlite'
+
+
+def create_index(cursor):
+    """Create the FTS5 table holding one row per project, keyed by project id"""
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5("
+        "title, description, tokenize='unicode61 remove_diacritics 1', prefix='2 3')".format(INDEX_TABLE))
+
+
+def drop_index(cursor):
+    cursor.execute("DROP TABLE IF EXISTS {}".format(INDEX_TABLE))
+
+
+def rebuild_index():
+    """Re-populate the index from the project table; soft-deleted projects stay out"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {}".format(INDEX_TABLE))
+        cursor.execute(
+            "INSERT INTO {}(rowid, title, description) "
+            "SELECT id, title, COALESCE(description, '') FROM accounts_project "
+            "WHERE deleted_at IS NULL".format(INDEX_TABLE))
+
+
+def index_project(project):
+    """Add or replace a single project in the index"""
+    index_projects([project])
+
+
+def index_projects(projects):
+    """Add or replace several projects with one statement each for the deletes and the inserts"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany("DELETE FROM {} WHERE rowid = %s".format(INDEX_TABLE),
+                           [[project.pk] for project in projects])
+        cursor.executemany(
+            "INSERT INTO {}(rowid, title, description) VALUES (%s, %s, %s)".format(INDEX_TABLE),
+            [[project.pk, project.title, project.description or ''] for project in projects])
+
+
+def remove_project(project_id):
+    """Drop a project from the index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {} WHERE rowid = %s".format(INDEX_TABLE), [project_id])
+
+
+def build_query(term):
+    """
+    Turn user input into an FTS5 query: every word must match,
+    and each word also matches as a prefix ("djan" finds "django")
+    """
+    words = re.findall(r'\w+', term or '')
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def search_projects(term, after=None, limit=RESULT_LIMIT):
+    """
+    Return (project id, score) pairs for the best matching projects,
+    most relevant first. `after` is the (score, id) pair of the last
+    result of the previous page.
+    """
+    query = build_query(term)
+    if not query:
+        return []
+    sql = "SELECT rowid, bm25({table}, %s, %s) AS score FROM {table} WHERE {table} MATCH %s"
+    params = [TITLE_WEIGHT, DESCRIPTION_WEIGHT, query]
+    if after is not None:
+        sql += " AND (score > %s OR (score = %s AND rowid > %s))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY score, rowid LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=INDEX_TABLE), params)
+        return cursor.fetchall()
+
+
+def search_project_ids(term, limit=RESULT_LIMIT):
+    """Return ids of the best matching projects, most relevant first"""
+    return [project_id for project_id, score in search_projects(term, limit=limit)]
+
+
+def format_cursor(score, project_id):
+    return '{!r}:{}'.format(score, project_id)
+
+
+def parse_cursor(cursor):
+    """Cursors of search result pages are "<score>:<project id>" """
+    try:
+        score, project_id = (cursor or '').split(':')
+        return float(score), int(project_id)
+    except ValueError:
+        return None
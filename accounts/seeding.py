@@ -0,0 +1,121 @@
+"""
+Synthetic data for load testing.
+
+Everything is written with bulk_create, which sends no signals, so the
+derived data the signals would maintain (profiles, skill tags, the search
+index, facets, the match matrix and application counts) is filled in or
+rebuilt explicitly.
+Names are numbered after any earlier seed run, so seeding can be repeated
+to grow the data set.
+"""
+import random
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import choices
+from . import models
+from . import search
+
+
+USERNAME = '{prefix}{number}@example.com'
+PASSWORD = 'password'
+BATCH_SIZE = 500
+
+SKILL_NAMES = [value for value, label in choices.SKILLS if value]
+WORDS = ('build', 'open', 'source', 'team', 'web', 'data', 'mobile', 'game', 'learning', 'platform',
+         'community', 'tool', 'service', 'api', 'dashboard', 'tracker', 'library', 'network')
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for word in range(length)).capitalize()
+
+
+@transaction.atomic
+def seed(users=100, skills_per_user=3, projects_per_user=2, positions_per_project=3,
+         applications_per_user=5, prefix='seed', random_seed=0):
+    """Create the requested rows and return how many of each were written"""
+    rng = random.Random(random_seed)
+    offset = models.User.objects.filter(username__startswith=prefix).count()
+    password = make_password(PASSWORD)
+
+    usernames = [USERNAME.format(prefix=prefix, number=offset + number) for number in range(users)]
+    models.User.objects.bulk_create(
+        (models.User(username=username, email=username, password=password) for username in usernames),
+        batch_size=BATCH_SIZE)
+    created_users = dict(models.User.objects.filter(username__in=usernames).values_list('id', 'username'))
+    user_ids = sorted(created_users)
+
+    models.Profile.objects.bulk_create(
+        (models.Profile(user_id=user_id,
+                        first_name='Seed',
+                        last_name=str(user_id),
+                        email=created_users[user_id],
+                        bio=sentence(rng, 12))
+         for user_id in user_ids),
+        batch_size=BATCH_SIZE)
+    profile_ids = dict(models.Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+
+    tags = {name: models.SkillTag.objects.for_name(name) for name in SKILL_NAMES}
+    skills = []
+    for user_id in user_ids:
+        for name in rng.sample(SKILL_NAMES, min(skills_per_user, len(SKILL_NAMES))):
+            skills.append(models.Skill(user_id=user_id, name=name, tag=tags[name]))
+    models.Skill.objects.bulk_create(skills, batch_size=BATCH_SIZE)
+
+    models.Project.objects.bulk_create(
+        (models.Project(user_id=user_id,
+                        title=sentence(rng, 3),
+                        description=sentence(rng, 15),
+                        timeline='{} weeks'.format(rng.randint(1, 12)),
+                        requirements=sentence(rng, 10),
+                        skill_needs=', '.join(rng.sample(SKILL_NAMES, 2)))
+         for user_id in user_ids for project in range(projects_per_user)),
+        batch_size=BATCH_SIZE)
+    projects = list(models.Project.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'skill_needs'))
+
+    models.Project.skill_tags.through.objects.bulk_create(
+        (models.Project.skill_tags.through(project_id=project_id, skilltag_id=tags[name.strip()].id)
+         for project_id, user_id, skill_needs in projects for name in skill_needs.split(',')),
+        batch_size=BATCH_SIZE)
+
+    models.Position.objects.bulk_create(
+        (models.Position(project_id=project_id,
+                         name=sentence(rng, 2),
+                         descript=sentence(rng, 20),
+                         skill=rng.choice(SKILL_NAMES),
+                         status=choices.OPEN if rng.random() < 0.7 else choices.FILLED)
+         for project_id, user_id, skill_needs in projects for position in range(positions_per_project)),
+        batch_size=BATCH_SIZE)
+    positions = list(models.Position.objects.filter(project__user_id__in=user_ids)
+                     .values_list('id', 'project__user_id'))
+
+    applications = []
+    statuses = [status for status, label in choices.APP_STATUS]
+    for user_id in user_ids:
+        chosen = set()
+        # Random draws rather than a shuffle of every position, so this stays linear in the user count
+        for attempt in range(applications_per_user * 3):
+            if len(chosen) >= applications_per_user or not positions:
+                break
+            position_id, owner_id = rng.choice(positions)
+            if owner_id != user_id:
+                chosen.add(position_id)
+        applications.extend(models.Application(user_id=profile_ids[user_id], position_id=position_id,
+                                               status=rng.choice(statuses))
+                            for position_id in sorted(chosen))
+    models.Application.objects.bulk_create(applications, batch_size=BATCH_SIZE)
+    models.count_applications(Counter((application.position_id, application.status)
+                                      for application in applications))
+
+    # Position.objects.bulk_create already updated the facets and the match matrix
+    search.rebuild_index()
+
+    return {
+        'users': len(user_ids),
+        'skills': len(skills),
+        'projects': len(projects),
+        'positions': len(positions),
+        'applications': len(applications),
+    }
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from . import assets
+
+
+# Name ContentAddressedStorage._save() is writing, per thread
+_saving = threading.local()
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store uploads under the SHA-256 of their content, keeping the upload
+    directory and extension, so identical uploads share one file
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(). FileSystemStorage
+        # asks again when that name turns out to be taken, which would retry
+        # the same name forever; raise so _save() can return it instead
+        if name == getattr(_saving, 'name', None):
+            raise FileExistsError(name)
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest.hexdigest() + extension)
+        if self.exists(name):
+            return name
+        _saving.name = name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            # An identical upload was stored since exists(): same name, same content
+            return name
+        finally:
+            _saving.name = None
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files with gzip/brotli copies of the text files,
+    for accounts.assets.serve or a web server configured to prefer them
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        compressed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if (not dry_run and hashed_name and not isinstance(processed, Exception)
+                    and assets.compressible(hashed_name)):
+                # Later passes may rewrite a file's references; compress the final content
+                compressed.add(hashed_name)
+            yield name, hashed_name, processed
+        for hashed_name in compressed:
+            assets.precompress(self.path(hashed_name))
+
+    def url_converter(self, name, hashed_files, template=None):
+        convert = super().url_converter(name, hashed_files, template)
+
+        def converter(match):
+            try:
+                return convert(match)
+            except ValueError:
+                # Leave references to missing files as written (the circle/ sass
+                # output quotes its @imports in comments) instead of failing
+                return match.group(0)
+        return converter
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected (development, tests): use the plain name
+            return name
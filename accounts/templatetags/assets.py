@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from accounts import assets
+
+
+register = template.Library()
+
+TAGS = {
+    '.css': '<link rel="stylesheet" href="{}">',
+    '.js': '<script type="text/javascript" src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(name):
+    """{% bundle "css/bundle.css" %}: the collected, hashed bundle, or its sources before build_assets has run"""
+    if not settings.DEBUG and name in getattr(staticfiles_storage, 'hashed_files', {}):
+        urls = [staticfiles_storage.url(name)]
+    else:
+        urls = [static(source) for source in assets.BUNDLES[name]]
+    tag = TAGS[name[name.rindex('.'):]]
+    return format_html_join('\n  ', tag, ((url,) for url in urls))
@@ -0,0 +1,12 @@
+from django import template
+
+from accounts import avatars
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size):
+    """{% avatar_url profile 200 %}: URL of the thumbnail that best fits a size x size box"""
+    return avatars.avatar_url(profile, size)
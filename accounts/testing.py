@@ -0,0 +1,28 @@
+"""Test helpers"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS):
+    """
+    Fail with an AssertionError listing the executed SQL
+    if the block runs more than max_queries queries
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context)
+    if executed > max_queries:
+        queries = '\n'.join(
+            '{}. {}'.format(number, query['sql'])
+            for number, query in enumerate(context.captured_queries, start=1))
+        raise AssertionError('{} queries executed, budget is {}\n{}'.format(executed, max_queries, queries))
+
+
+class QueryBudgetMixin:
+    """TestCase mixin: with self.assertMaxQueries(5): self.client.get(url)"""
+
+    def assertMaxQueries(self, max_queries, using=DEFAULT_DB_ALIAS):
+        return query_budget(max_queries, using=using)
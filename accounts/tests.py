@@ -1,9 +1,52 @@
-from django.test import TestCase, Client
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
+from django.utils import timezone
 from django_webtest import WebTest
 
+from . import api
+from . import assets
+from . import avatars
+from . import caching
+from . import decisions
+from . import deletion
 from . import models
 from . import forms
+from . import identity
+from . import choices
+from . import matching
+from . import metrics
+from . import notifications
+from . import readmodels
+from . import routers
+from . import search
+from . import seeding
+from . import views
+from .pagination import PAGE_SIZE
+from .middleware import ReplicaMiddleware
+from .storage import ContentAddressedStorage
+from .testing import QueryBudgetMixin
 
 
 class FormTest(WebTest):
@@ -216,3 +259,1435 @@ class DeleteTests(TestCase):
         self.client.login(username="test@test.com", password="password")
         response = self.client.get(reverse('accounts:application_delete', kwargs={'pk': 1}))
         self.assertEqual(response.status_code, 302)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(
+            username="test@test.com",
+        )
+        self.new_user.set_password('password')
+        self.new_user.save()
+
+        self.django_project = models.Project.objects.create(
+            user=self.new_user,
+            title="Django Team Builder",
+            description="Build teams for projects"
+        )
+        self.flask_project = models.Project.objects.create(
+            user=self.new_user,
+            title="Flask Blog",
+            description="A blog written with Django templates in mind"
+        )
+        self.client.login(username="test@test.com", password="password")
+
+    def test_prefix_match(self):
+        self.assertEqual(search.search_project_ids("djan"), [self.django_project.id, self.flask_project.id])
+
+    def test_title_ranks_above_description(self):
+        self.assertEqual(search.search_project_ids("django")[0], self.django_project.id)
+
+    def test_all_words_must_match(self):
+        self.assertEqual(search.search_project_ids("flask blog"), [self.flask_project.id])
+
+    def test_limit(self):
+        self.assertEqual(len(search.search_project_ids("django", limit=1)), 1)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.flask_project.title = "Pyramid Blog"
+        self.flask_project.save()
+        self.assertEqual(search.search_project_ids("pyramid"), [self.flask_project.id])
+        self.flask_project.delete()
+        self.assertEqual(search.search_project_ids("pyramid"), [])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('accounts:search'), {'q': 'flask'})
+        self.assertEqual(list(response.context['projects']), [self.flask_project])
+
+    def test_empty_search(self):
+        response = self.client.get(reverse('accounts:search'))
+        self.assertEqual(list(response.context['projects']), [])
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(
+            username="test@test.com",
+        )
+        self.new_user.set_password('password')
+        self.new_user.save()
+
+        for number in range(PAGE_SIZE + 5):
+            project = models.Project.objects.create(
+                user=self.new_user,
+                title="Project {}".format(number),
+                description="Test Description"
+            )
+            models.Position.objects.create(project=project, name="Developer", skill="Django")
+        self.client.login(username="test@test.com", password="password")
+
+    def assert_pages(self, url, params=None):
+        params = dict(params or {})
+        first = self.client.get(url, params).context['projects']
+        self.assertEqual(len(first), PAGE_SIZE)
+        self.assertTrue(first.has_next)
+        params['after'] = first.next_cursor
+        second = self.client.get(url, params).context['projects']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next)
+        seen = [project.id for project in first] + [project.id for project in second]
+        self.assertEqual(len(set(seen)), PAGE_SIZE + 5)
+
+    def test_index_pages(self):
+        self.assert_pages(reverse('accounts:index'))
+
+    def test_index_has_no_positions(self):
+        response = self.client.get(reverse('accounts:index'))
+        self.assertNotIn('positions', response.context)
+        self.assertContains(response, 'Next page')
+
+    def test_search_pages(self):
+        self.assert_pages(reverse('accounts:search'), {'q': 'project'})
+
+    def test_sort_by_skill_pages(self):
+        self.assert_pages(reverse('accounts:sort', kwargs={'skillz': 'Django'}))
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+
+        self.project = models.Project.objects.create(
+            user=self.owner,
+            title="Test Project",
+            description="Test Description"
+        )
+        self.position = models.Position.objects.create(project=self.project, name="Developer", skill="Django")
+        self.applicants = []
+        for number in range(10):
+            applicant = models.User.objects.create(username="applicant{}@test.com".format(number))
+            self.applicants.append(applicant)
+            models.Application.objects.create(
+                user=applicant.profile,
+                position=self.position,
+                status=choices.APP_STATUS[number % 3][0]
+            )
+        self.client.login(username="owner@test.com", password="password")
+
+    def test_applications_inbox(self):
+        # session, user, applications, projects, sidebar facets, identity profile and skills
+        with self.assertMaxQueries(7):
+            response = self.client.get(reverse('accounts:applications'))
+        self.assertEqual(len(response.context['applications']), 10)
+        self.assertEqual(len(response.context['new_applications']), 3)
+        self.assertEqual(len(response.context['approved_applications']), 4)
+        self.assertEqual(len(response.context['denied_applications']), 3)
+
+    def test_project_view(self):
+        for number in range(10):
+            models.Position.objects.create(project=self.project, name="Position {}".format(number))
+        # session, user, project card, identity profile and skills
+        with self.assertMaxQueries(5):
+            response = self.client.get(reverse('accounts:project', kwargs={'pk': self.project.id}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_application_update_view(self):
+        application = models.Application.objects.first()
+        # Includes loading the identity for the layout
+        with self.assertMaxQueries(7):
+            response = self.client.get(reverse('accounts:application_detail', kwargs={'pk': application.id}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_failure_is_reported(self):
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(0):
+                models.Project.objects.count()
+
+
+class BrokenEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("mail server unavailable")
+
+
+class RefusingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if "refused" in message.to[0]:
+                raise ConnectionError("recipient refused")
+            mail.outbox.append(message)
+        return len(email_messages)
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("mail server unreachable")
+
+    def send_messages(self, email_messages):
+        raise AssertionError("never opened")
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        self.applicant = models.User.objects.create(username="applicant@test.com")
+
+        project = models.Project.objects.create(user=self.owner, title="Test Project")
+        position = models.Position.objects.create(project=project, name="Developer", skill="Django")
+        self.application = models.Application.objects.create(user=self.applicant.profile, position=position)
+        self.client.login(username="owner@test.com", password="password")
+
+    def decide(self, status):
+        return self.client.post(
+            reverse('accounts:application_detail', kwargs={'pk': self.application.id}), {'status': status})
+
+    def test_decision_is_queued_not_sent(self):
+        response = self.decide('approved')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        message = models.OutboxMessage.objects.get()
+        self.assertEqual(message.recipient, "applicant@test.com")
+        self.assertEqual(message.status, choices.PENDING)
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, 'approved')
+
+    def test_drain_batches_over_one_connection(self):
+        self.decide('approved')
+        self.decide('denied')
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend',
+                               EMAIL_FILE_PATH=directory):
+                sent, failed = notifications.drain_outbox(batch_size=1)
+                # One connection means one file for every message
+                self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertEqual((sent, failed), (2, 0))
+        self.assertEqual(models.OutboxMessage.objects.filter(status=choices.SENT).count(), 2)
+
+    def test_failed_batch_is_retried_with_backoff(self):
+        self.decide('denied')
+        sent, failed = notifications.drain_outbox(connection=BrokenEmailBackend())
+        self.assertEqual((sent, failed), (0, 1))
+        message = models.OutboxMessage.objects.get()
+        self.assertEqual(message.status, choices.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt, timezone.now())
+        # Not due yet
+        self.assertEqual(notifications.drain_outbox(), (0, 0))
+
+        models.OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(notifications.drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_one_refused_recipient_fails_only_its_message(self):
+        for recipient in ("first@test.com", "refused@test.com", "last@test.com"):
+            models.OutboxMessage.objects.create(subject="Hello", body="Hi", recipient=recipient)
+        self.assertEqual(notifications.drain_outbox(connection=RefusingEmailBackend()), (2, 1))
+        self.assertEqual([email.to for email in mail.outbox], [["first@test.com"], ["last@test.com"]])
+        refused = models.OutboxMessage.objects.get(recipient="refused@test.com")
+        self.assertEqual((refused.status, refused.attempts), (choices.PENDING, 1))
+        self.assertEqual(models.OutboxMessage.objects.filter(status=choices.SENT).count(), 2)
+
+    def test_failure_to_connect_is_retried(self):
+        self.decide('denied')
+        self.assertEqual(notifications.drain_outbox(connection=UnreachableEmailBackend()), (0, 1))
+        message = models.OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), (choices.PENDING, 1))
+        self.assertIn("unreachable", message.last_error)
+        self.assertGreater(message.next_attempt, timezone.now())
+
+    def test_claimed_messages_are_not_sent_twice(self):
+        self.decide('approved')
+        self.assertEqual(len(notifications.claim_messages()), 1)
+        # Another sender finds nothing due until the claim expires
+        self.assertEqual(notifications.claim_messages(), [])
+        self.assertEqual(notifications.drain_outbox(), (0, 0))
+
+        models.OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(notifications.drain_outbox(), (1, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        self.decide('denied')
+        models.OutboxMessage.objects.update(attempts=notifications.MAX_ATTEMPTS - 1)
+        notifications.drain_outbox(connection=BrokenEmailBackend())
+        self.assertEqual(models.OutboxMessage.objects.get().status, choices.FAILED)
+
+    def test_send_outbox_command(self):
+        self.decide('approved')
+        out = io.StringIO()
+        call_command('send_outbox', stdout=out)
+        self.assertIn("Sent 1 message(s)", out.getvalue())
+        self.assertEqual(mail.outbox[0].subject, "Your application for Developer")
+
+    def test_digest_subscribers_get_one_message_for_all_decisions(self):
+        profile = self.applicant.profile
+        profile.notification_mode = choices.DIGEST
+        profile.save()
+        position = models.Position.objects.create(project=self.application.position.project, name="Designer")
+        other = models.Application.objects.create(user=profile, position=position)
+        self.decide('approved')
+        self.client.post(reverse('accounts:application_detail', kwargs={'pk': other.id}), {'status': 'denied'})
+        self.assertFalse(models.OutboxMessage.objects.exists())
+        self.assertEqual(models.DigestEvent.objects.count(), 2)
+
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command('build_digests', stdout=out)
+        self.assertIn("Queued 1 digest(s)", out.getvalue())
+        self.assertIn("Sent 1 message(s)", out.getvalue())
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('SELECT') and 'accounts_digestevent' in query['sql']]), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Your applications: 2 updates")
+        self.assertIn("Developer (Test Project): Congratulations!", mail.outbox[0].body)
+        self.assertIn("Designer (Test Project): Thank you", mail.outbox[0].body)
+        self.assertFalse(models.DigestEvent.objects.exists())
+        self.assertEqual(notifications.build_digests(), 0)
+
+    def test_digest_drops_every_event_it_sends(self):
+        other = models.User.objects.create(username="other@test.com").profile
+        models.Profile.objects.filter(id__in=[self.applicant.profile.id, other.id]).update(
+            notification_mode=choices.DIGEST)
+        position = self.application.position
+        second = models.Application.objects.create(user=other, position=position)
+        # Ids interleave, and the recipient read first has the highest event id
+        for application, status in [(second, choices.DENIED), (self.application, choices.DENIED),
+                                    (second, choices.APPROVED), (self.application, choices.APPROVED)]:
+            models.DigestEvent.objects.create(recipient=application.user, application=application, status=status)
+
+        self.assertEqual(notifications.build_digests(), 2)
+        self.assertFalse(models.DigestEvent.objects.exists())
+        self.assertEqual(notifications.build_digests(), 0)
+
+    def test_notification_mode_is_kept_when_not_posted(self):
+        profile = self.applicant.profile
+        profile.notification_mode = choices.DIGEST
+        profile.save()
+        form = forms.ProfileForm({'first_name': 'Test'}, instance=profile)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().notification_mode, choices.DIGEST)
+
+
+def image_upload(name="avatar.png", color='red', size=(800, 600)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+
+class AvatarTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = models.User.objects.create(username="test@test.com")
+        self.other = models.User.objects.create(username="other@test.com")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def upload(self, profile, upload):
+        form = forms.ProfileForm({'first_name': 'Test'}, {'avatar': upload}, instance=profile)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload(self.user.profile, image_upload("one.png"))
+        second = self.upload(self.other.profile, image_upload("two.PNG"))
+        self.assertEqual(first.avatar.name, second.avatar.name)
+        self.assertRegex(first.avatar.name, r'^avatars/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root.name, 'avatars'))), 1)
+
+    def test_concurrent_identical_upload(self):
+        class RacingStorage(ContentAddressedStorage):
+            # As if the other upload was written between exists() and the write
+            def exists(self, name):
+                return False
+
+        storage = RacingStorage()
+        first = storage.save("avatars/one.png", image_upload("one.png"))
+        self.assertEqual(storage.save("avatars/two.png", image_upload("two.png")), first)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root.name, 'avatars'))), 1)
+
+    def test_process_renders_webp_thumbnails(self):
+        profile = self.upload(self.user.profile, image_upload())
+        self.assertFalse(profile.avatar_processed)
+        self.assertEqual(avatars.avatar_url(profile, 200), profile.avatar.url)
+
+        call_command('process_avatars', stdout=io.StringIO())
+        profile.refresh_from_db()
+        self.assertTrue(profile.avatar_processed)
+        for size in avatars.AVATAR_SIZES:
+            path = os.path.join(self.media_root.name, avatars.rendition_name(profile.avatar.name, size))
+            with Image.open(path) as thumbnail:
+                self.assertEqual(thumbnail.format, 'WEBP')
+                self.assertEqual(thumbnail.size, (size, size))
+        self.assertTrue(avatars.avatar_url(profile, 150).endswith('/200/{}.webp'.format(
+            os.path.splitext(os.path.basename(profile.avatar.name))[0])))
+
+    def test_new_upload_is_reprocessed(self):
+        profile = self.upload(self.user.profile, image_upload())
+        avatars.process_pending()
+        profile = self.upload(models.Profile.objects.get(id=profile.id), image_upload(color='blue'))
+        self.assertFalse(profile.avatar_processed)
+
+
+class SkillTagTest(TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.client.login(username="test@test.com", password="password")
+
+    def test_tags_are_seeded_from_choices(self):
+        names = set(models.SkillTag.objects.values_list('name', flat=True))
+        self.assertTrue({'Python', 'Django', 'Flask', 'CSS', 'JavaScript'} <= names)
+
+    def test_position_and_skill_are_tagged(self):
+        project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        position = models.Position.objects.create(project=project, name="Developer", skill="css")
+        skill = models.Skill.objects.create(user=self.new_user, name="Python")
+        self.assertEqual(position.tag.slug, 'css')
+        self.assertEqual(skill.tag.name, 'Python')
+
+    def test_project_needs_are_tagged(self):
+        project = models.Project.objects.create(
+            user=self.new_user, title="Test Project", skill_needs="Python, Django and more")
+        self.assertEqual(set(project.skill_tags.values_list('slug', flat=True)), {'python', 'django'})
+
+    def test_sort_by_skill_is_distinct(self):
+        project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        models.Position.objects.create(project=project, name="Backend", skill="Django")
+        models.Position.objects.create(project=project, name="Frontend", skill="Django")
+        models.Position.objects.create(
+            project=models.Project.objects.create(user=self.new_user, title="Other"), name="Styling", skill="css")
+        response = self.client.get(reverse('accounts:sort', kwargs={'skillz': 'Django'}))
+        self.assertEqual(list(response.context['projects']), [project])
+
+
+class SkillFacetTest(TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.project = models.Project.objects.create(user=self.new_user, title="Test Project")
+
+    def open_positions(self, slug):
+        return models.SkillFacet.objects.get(tag__slug=slug).open_positions
+
+    def test_counts_follow_position_changes(self):
+        position = models.Position.objects.create(project=self.project, name="Backend", skill="Django")
+        models.Position.objects.create(project=self.project, name="Frontend", skill="Django")
+        self.assertEqual(self.open_positions('django'), 2)
+
+        position.status = choices.FILLED
+        position.save()
+        self.assertEqual(self.open_positions('django'), 1)
+
+        position = models.Position.objects.get(id=position.id)
+        position.status = choices.OPEN
+        position.skill = "Flask"
+        position.save()
+        self.assertEqual(self.open_positions('django'), 1)
+        self.assertEqual(self.open_positions('flask'), 1)
+
+        position.delete()
+        self.assertEqual(self.open_positions('flask'), 0)
+
+        self.project.delete()
+        self.assertEqual(self.open_positions('django'), 0)
+
+    def test_new_tags_get_a_facet(self):
+        models.Position.objects.create(project=self.project, name="Data", skill="Pandas")
+        self.assertEqual(self.open_positions('pandas'), 1)
+
+    def test_rebuild(self):
+        models.Position.objects.create(project=self.project, name="Backend", skill="Python")
+        models.SkillFacet.objects.update(open_positions=0)
+        call_command('rebuild_facets', stdout=io.StringIO())
+        self.assertEqual(self.open_positions('python'), 1)
+        self.assertEqual(self.open_positions('css'), 0)
+
+    def test_sidebar_shows_counts(self):
+        models.Position.objects.create(project=self.project, name="Backend", skill="Python")
+        models.Skill.objects.create(user=self.new_user, name="Haskell")
+        response = self.client.get(reverse('accounts:index'))
+        self.assertContains(response, "Python (1)")
+        # No open positions
+        self.assertNotContains(response, "Haskell (0)")
+        self.assertNotContains(response, "Django (0)")
+
+
+class MatchingTest(TestCase):
+    def setUp(self):
+        matching.invalidate()
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.user = models.User.objects.create(username="test@test.com")
+        self.user.set_password('password')
+        self.user.save()
+        models.Skill.objects.create(user=self.user, name="Django")
+        models.Skill.objects.create(user=self.user, name="Python")
+
+        self.project = models.Project.objects.create(
+            user=self.owner, title="Test Project", skill_needs="Python")
+        self.backend = models.Position.objects.create(project=self.project, name="Backend", skill="Django")
+        self.styling = models.Position.objects.create(project=self.project, name="Styling", skill="css")
+        other = models.Project.objects.create(user=self.owner, title="Other Project")
+        self.scripting = models.Position.objects.create(project=other, name="Scripting", skill="Python")
+
+    def recommended(self):
+        tag_ids = models.Skill.objects.filter(user=self.user).values_list('tag_id', flat=True)
+        return [position.name for position in matching.recommend(self.user, list(tag_ids))]
+
+    def test_ranking(self):
+        # Backend matches its own skill and the project's needs
+        self.assertEqual(self.recommended(), ["Backend", "Scripting", "Styling"])
+
+    def test_matrix_is_updated_incrementally(self):
+        matrix = matching.get_matrix()
+        self.styling.status = choices.FILLED
+        self.styling.save()
+        self.assertIs(matching.get_matrix(), matrix)
+        self.assertEqual(self.recommended(), ["Backend", "Scripting"])
+
+        models.Position.objects.create(project=self.project, name="API", skill="Python")
+        self.scripting.delete()
+        self.assertIs(matching.get_matrix(), matrix)
+        self.assertEqual(self.recommended(), ["Backend", "API"])
+
+    def test_bulk_created_positions_and_project_needs_are_patched_in(self):
+        matrix = matching.get_matrix()
+        models.Position.objects.bulk_create([models.Position(project=self.project, name="API", skill="Python")])
+        self.project.title = "Renamed Project"
+        self.project.save()
+        self.assertIs(matching.get_matrix(), matrix)
+        self.assertEqual(self.recommended(), ["Backend", "API", "Scripting", "Styling"])
+
+        self.project.skill_needs = ""
+        self.project.save()
+        self.assertIs(matching.get_matrix(), matrix)
+        # Only the positions' own skills count now; ties go to older positions
+        self.assertEqual(self.recommended(), ["Backend", "Scripting", "API"])
+
+    def test_matrix_columns_are_tags_positions_use(self):
+        models.Skill.objects.create(user=self.user, name="Haskell")
+        matrix = matching.get_matrix()
+        self.assertEqual(set(matrix.columns), set(models.SkillTag.objects.filter(
+            slug__in=['python', 'django', 'css']).values_list('id', flat=True)))
+
+    def test_matrix_grows_by_doubling(self):
+        matrix = matching.PositionMatrix(None)
+        copies = 0
+        for position_id in range(1, 5001):
+            weights = matrix.weights
+            matrix.upsert(position_id, position_id % 100 + 1, 1, [])
+            copies += matrix.weights is not weights
+        self.assertLessEqual(copies, 10)
+        self.assertEqual(len(matrix.columns), 100)
+        self.assertEqual(matrix.score([8], limit=2), [(7, 2.0), (107, 2.0)])
+
+    def test_changes_from_other_processes_trigger_rebuild(self):
+        matrix = matching.get_matrix()
+        cache.incr(matching.VERSION_KEY)
+        self.assertIsNot(matching.get_matrix(), matrix)
+
+    def test_excludes_own_and_applied_positions(self):
+        models.Application.objects.create(user=self.user.profile, position=self.backend)
+        models.Position.objects.create(
+            project=models.Project.objects.create(user=self.user, title="Mine"), name="Mine", skill="Django")
+        self.assertEqual(self.recommended(), ["Scripting", "Styling"])
+
+    def test_endpoint_and_profile(self):
+        self.client.login(username="test@test.com", password="password")
+        response = self.client.get(reverse('accounts:recommended_positions'))
+        self.assertEqual([position['name'] for position in response.json()['positions']],
+                         ["Backend", "Scripting", "Styling"])
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertContains(response, "Backend")
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        self.position = models.Position.objects.create(project=self.project, name="Developer", skill="Django")
+        self.client.login(username="test@test.com", password="password")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, len(context)
+
+    def test_index_table_is_cached_until_a_project_changes(self):
+        url = reverse('accounts:index')
+        # Load the cached identity, then start over with an empty table fragment
+        self.client.get(url)
+        caching.bump_projects_version()
+        response, cold = self.count_queries(url)
+        response, warm = self.count_queries(url)
+        self.assertEqual(warm, cold - 1)
+        self.assertContains(response, "Test Project")
+
+        self.project.title = "Renamed Project"
+        self.project.save()
+        response, queries = self.count_queries(url)
+        self.assertEqual(queries, cold)
+        self.assertContains(response, "Renamed Project")
+
+
+class ProjectCardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.new_user.profile.first_name = "Tess"
+        self.new_user.profile.last_name = "Owner"
+        self.new_user.profile.save()
+        self.project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        self.position = models.Position.objects.create(project=self.project, name="Developer", skill="Django")
+        self.client.login(username="test@test.com", password="password")
+        self.url = reverse('accounts:project', kwargs={'pk': self.project.id})
+
+    def project_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [query for query in context.captured_queries if 'accounts_project' in query['sql']]
+
+    def test_card_holds_project_owner_and_positions(self):
+        card = readmodels.project_card(self.project.id)
+        self.assertEqual(card['title'], "Test Project")
+        self.assertEqual(card['owner_name'], "Tess Owner")
+        self.assertEqual([position['name'] for position in card['positions']], ["Developer"])
+
+    def test_cached_card_costs_no_query(self):
+        response, cold = self.project_queries(self.url)
+        self.assertEqual(len(cold), 1)
+        response, warm = self.project_queries(self.url)
+        self.assertEqual(warm, [])
+        self.assertContains(response, "Tess Owner")
+        self.assertContains(response, "Developer")
+
+    def test_card_follows_writes(self):
+        self.client.get(self.url)
+        self.position.status = choices.FILLED
+        self.position.save()
+        self.assertContains(self.client.get(self.url), "Position Filled")
+
+        models.Position.objects.bulk_create([models.Position(project=self.project, name="Designer")])
+        self.assertContains(self.client.get(self.url), "Designer")
+
+        self.new_user.profile.first_name = "Renamed"
+        self.new_user.profile.save()
+        self.assertContains(self.client.get(self.url), "Renamed Owner")
+
+    def test_missing_project(self):
+        self.project.delete()
+        self.assertIsNone(readmodels.project_card(self.project.id))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class ProjectWriteTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.client.login(username="test@test.com", password="password")
+
+    def position_data(self, count, prefix='position', initial=0):
+        data = {
+            prefix + '-TOTAL_FORMS': count,
+            prefix + '-INITIAL_FORMS': initial,
+            prefix + '-MIN_NUM_FORMS': 0,
+            prefix + '-MAX_NUM_FORMS': 1000,
+        }
+        for number in range(count):
+            data['{}-{}-name'.format(prefix, number)] = "Position {}".format(number)
+            data['{}-{}-skill'.format(prefix, number)] = "Django"
+            data['{}-{}-descript'.format(prefix, number)] = "Description"
+        return data
+
+    def test_create_project_with_positions(self):
+        data = self.position_data(3)
+        data.update({'title': "Test Project", 'description': "Test Description",
+                     'timeline': "Two weeks", 'requirements': "None"})
+        response = self.client.post(reverse('accounts:project_new'), data)
+        self.assertEqual(response.status_code, 302)
+        project = models.Project.objects.get()
+        self.assertEqual(project.position_set.count(), 3)
+        self.assertEqual(models.SkillFacet.objects.get(tag__slug='django').open_positions, 3)
+
+    def test_update_cost_does_not_grow_with_positions(self):
+        project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        url = reverse('accounts:project_edit', kwargs={'pk': project.id})
+        data = self.position_data(25)
+        data.update({'project-title': "Renamed", 'project-description': "Test Description",
+                     'project-timeline': "Two weeks", 'project-requirements': "None"})
+        with self.assertMaxQueries(20):
+            self.client.post(url, data)
+        self.assertEqual(project.position_set.filter(tag__slug='django').count(), 25)
+        project.refresh_from_db()
+        self.assertEqual(project.title, "Renamed")
+
+    def test_bulk_endpoint(self):
+        payload = {
+            'title': "Big Project",
+            'description': "Lots of positions",
+            'timeline': "Two weeks",
+            'requirements': "None",
+            'positions': [{'name': "Position {}".format(number), 'skill': "Python", 'descript': "Description"}
+                          for number in range(200)],
+        }
+        response = self.client.post(reverse('accounts:project_bulk'), json.dumps(payload),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        project = models.Project.objects.get(id=response.json()['id'])
+        self.assertEqual(project.position_set.count(), 200)
+        self.assertEqual(models.SkillFacet.objects.get(tag__slug='python').open_positions, 200)
+
+    def test_bulk_endpoint_is_all_or_nothing(self):
+        payload = {'title': "Big Project", 'description': "Test", 'positions': [{'name': "Fine", 'skill': "Python", 'descript': "Description"},
+                                  {'skill': "Python"}]}
+        response = self.client.post(reverse('accounts:project_bulk'), json.dumps(payload),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('1', response.json()['errors']['positions'])
+        self.assertFalse(models.Project.objects.exists())
+
+
+class SeedBenchmarkTest(TestCase):
+    def test_seed_writes_consistent_data(self):
+        counts = seeding.seed(users=5, projects_per_user=2, positions_per_project=2, applications_per_user=3)
+        self.assertEqual(counts['projects'], 10)
+        self.assertEqual(models.User.objects.filter(username__startswith='seed').count(), 5)
+        self.assertEqual(models.Profile.objects.filter(user__username__startswith='seed').count(), 5)
+        self.assertFalse(models.Application.objects.filter(position__project__user__profile=F('user')).exists())
+        self.assertEqual(sum(facet.open_positions for facet in models.SkillFacet.objects.all()),
+                         models.Position.objects.filter(status=choices.OPEN).count())
+        self.assertEqual(sum(counts.total for counts in models.OwnerApplicationCounts.objects.all()),
+                         counts['applications'])
+        self.assertTrue(self.client.login(username='seed0@example.com', password=seeding.PASSWORD))
+
+        seeding.seed(users=2)
+        self.assertTrue(models.User.objects.filter(username='seed6@example.com').exists())
+
+    def test_benchmark_reports_every_page(self):
+        seeding.seed(users=3, applications_per_user=3)
+        output = io.StringIO()
+        call_command('benchmark', iterations=2, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertIn('project', report['results'])
+        self.assertNotIn('skill_delete', report['results'])
+        for name, result in report['results'].items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.client.login(username="test@test.com", password="password")
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def sample(self, text, line_start):
+        for line in text.splitlines():
+            if line.startswith(line_start):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_requests_are_recorded_per_url_name(self):
+        before = self.scrape()
+        self.client.get(reverse('accounts:index'))
+        after = self.scrape()
+        requests = 'soc_http_requests_total{view="accounts:index",method="GET",status="200"}'
+        self.assertEqual(self.sample(after, requests), self.sample(before, requests) + 1)
+        queries = 'soc_db_queries_per_request_sum{view="accounts:index"}'
+        self.assertGreater(self.sample(after, queries), self.sample(before, queries))
+        self.assertIn('soc_http_request_duration_seconds_bucket{view="accounts:index",le="+Inf"}', after)
+        self.assertIn('soc_http_response_size_bytes_count{view="accounts:index"}', after)
+
+    def test_only_allowed_addresses_can_scrape(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_snapshots_of_all_workers_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            other_worker = metrics.Histogram('worker_test', "", ('view',), (1, 2))
+            other_worker.observe(('accounts:index',), 1.5)
+            with open(os.path.join(directory, 'metrics-1-1.json'), 'w') as output:
+                json.dump({other_worker.name: [[['accounts:index'], other_worker.values[('accounts:index',)]]],
+                           metrics.REQUESTS.name: [[['accounts:index', 'GET', '200'], 1000]]}, output)
+            text = self.scrape()
+            self.assertTrue(os.path.exists(metrics.snapshot_path()))
+        requests = 'soc_http_requests_total{view="accounts:index",method="GET",status="200"}'
+        self.assertGreaterEqual(self.sample(text, requests), 1000)
+        self.assertEqual(metrics.render([other_worker]).count('soc_worker_test_bucket'), 3)
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.projects = []
+        for number in range(5):
+            project = models.Project.objects.create(user=self.owner, title="Project {}".format(number))
+            models.Position.objects.create(project=project, name="Developer", skill="Django",
+                                           status=choices.FILLED if number % 2 else choices.OPEN)
+            models.Position.objects.create(project=project, name="Designer", skill="CSS")
+            self.projects.append(project)
+
+    def test_project_pages(self):
+        response = self.client.get(reverse('accounts:api_projects'), {'limit': 3})
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['results']], [project.id for project in self.projects[:1:-1]])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.projects[1].id, self.projects[0].id])
+        self.assertIsNone(data['next'])
+
+    def test_filters_match_the_same_position(self):
+        response = self.client.get(reverse('accounts:api_projects'), {'skill': 'django', 'status': choices.OPEN})
+        self.assertEqual({row['id'] for row in response.json()['results']},
+                         {self.projects[0].id, self.projects[2].id, self.projects[4].id})
+        response = self.client.get(reverse('accounts:api_positions'),
+                                   {'skill': 'css', 'project': self.projects[0].id})
+        self.assertEqual([(row['name'], row['tag']) for row in response.json()['results']], [("Designer", 'css')])
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('accounts:api_positions'), {'status': 'closed'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('filter', response.json()['errors'])
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse('accounts:api_positions'), {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows, sorted(rows, key=lambda row: row['id']))
+
+        response = self.client.get(reverse('accounts:api_positions'), {'format': 'ndjson', 'since_id': rows[7]['id']})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        # after is the page cursor of the JSON listing
+        response = self.client.get(reverse('accounts:api_positions'), {'format': 'ndjson', 'after': rows[7]['id']})
+        self.assertEqual(response.status_code, 400)
+
+
+class ApplicationExportTest(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        self.projects = [models.Project.objects.create(user=self.owner, title="Project {}".format(number))
+                         for number in range(2)]
+        for number in range(3):
+            applicant = models.User.objects.create(username="applicant{}@test.com".format(number))
+            applicant.profile.first_name = "=cmd" if number == 0 else "Applicant"
+            applicant.profile.save()
+            for project in self.projects:
+                position = models.Position.objects.create(project=project, name="Position {}".format(number))
+                models.Application.objects.create(user=applicant.profile, position=position)
+        other = models.User.objects.create(username="other@test.com")
+        self.other_project = models.Project.objects.create(user=other, title="Other")
+        self.client.login(username="owner@test.com", password="password")
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_all_projects(self):
+        with CaptureQueriesContext(connection) as context:
+            rows = self.rows(self.client.get(reverse('accounts:applications_export')))
+        self.assertEqual(rows[0][0], 'application')
+        self.assertEqual(len(rows), 7)
+        # session, user, then a single query for the applications however many there are
+        self.assertEqual(len(context), 3)
+
+    def test_one_project(self):
+        response = self.client.get(reverse('accounts:project_applications_export', kwargs={'pk': self.projects[1].id}))
+        self.assertIn('project-{}'.format(self.projects[1].id), response['Content-Disposition'])
+        rows = self.rows(response)
+        self.assertEqual({row[1] for row in rows[1:]}, {"Project 1"})
+        self.assertIn("'=cmd", [row[4] for row in rows])
+
+    def test_other_owners_project(self):
+        response = self.client.get(reverse('accounts:project_applications_export', kwargs={'pk': self.other_project.id}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportProjectsTest(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write('projects.csv', '\n'.join([
+            'owner,title,description,timeline,requirements,skill_needs,position_name,position_skill,position_descript',
+            'owner@test.com,Rocket,Build a rocket,1 week,None,Python,Engineer,Python,Welds',
+            'owner@test.com,Rocket,Build a rocket,1 week,None,Python,Designer,CSS,Draws',
+            'owner@test.com,Balloon,Fly a balloon,2 weeks,None,,Pilot,Django,Flies',
+            'nobody@test.com,Ghost,Boo,1 week,None,,,,',
+            'owner@test.com,Kite,,1 week,None,,Flyer,Django,',
+        ]))
+        output = io.StringIO()
+        errors = io.StringIO()
+        call_command('import_projects', path, batch_size=1, stdout=output, stderr=errors)
+
+        rocket = models.Project.objects.get(title="Rocket")
+        self.assertEqual(sorted(rocket.position_set.values_list('name', flat=True)), ["Designer", "Engineer"])
+        self.assertEqual(list(rocket.skill_tags.values_list('slug', flat=True)), ['python'])
+        self.assertEqual(models.Project.objects.get(title="Balloon").position_set.get().tag.slug, 'django')
+        self.assertFalse(models.Project.objects.filter(title__in=["Ghost", "Kite"]).exists())
+        if search.is_available():
+            self.assertEqual(search.search_project_ids("rocket"), [rocket.id])
+        self.assertIn("Imported 2 projects with 3 positions, 2 rejected", output.getvalue())
+        self.assertIn("Unknown owner", errors.getvalue())
+        self.assertIn("descript", errors.getvalue())
+
+    def test_json_with_default_owner(self):
+        existing = models.Project.objects.create(user=self.owner, title="Existing")
+        path = self.write('projects.json', json.dumps([
+            {'title': "One", 'description': "First", 'timeline': "1 week", 'requirements': "None",
+             'positions': [{'name': "Dev", 'skill': "Django", 'descript': "Code"}]},
+            {'title': "Two", 'description': "Second", 'timeline': "1 week", 'requirements': "None"},
+            "not a project",
+        ]))
+        rejects = os.path.join(self.directory.name, 'rejects.jsonl')
+        call_command('import_projects', path, owner="owner@test.com", rejects=rejects, stdout=io.StringIO())
+
+        projects = models.Project.objects.filter(user=self.owner).order_by('id')
+        self.assertEqual([project.title for project in projects], ["Existing", "One", "Two"])
+        self.assertGreater(projects[1].id, existing.id)
+        self.assertEqual(projects[1].position_set.get().name, "Dev")
+        with open(rejects) as source:
+            self.assertEqual([json.loads(line)['line'] for line in source], [3])
+
+    def test_ids_of_deleted_projects_are_not_reused(self):
+        deleted = models.Project.objects.create(user=self.owner, title="Deleted")
+        deleted_id = deleted.id
+        deleted.delete()
+        path = self.write('projects.json', json.dumps([
+            {'title': "New", 'description': "Fresh", 'timeline': "1 week", 'requirements': "None"}]))
+        call_command('import_projects', path, owner="owner@test.com", stdout=io.StringIO())
+        self.assertGreater(models.Project.objects.get(title="New").id, deleted_id)
+
+
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        routers.reset()
+        self.addCleanup(routers.reset)
+        self.router = routers.ReplicaRouter()
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+
+    def request(self, method='get', pinned_until=0):
+        request = getattr(RequestFactory(), method)('/')
+        request.session = SessionStore()
+        if pinned_until:
+            request.session[ReplicaMiddleware.PIN_KEY] = pinned_until
+        return request
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_router(self):
+        self.assertIsNone(self.router.db_for_read(models.Project))
+        routers.use_replicas()
+        self.assertEqual(self.router.db_for_read(models.Project), 'replica')
+        self.assertIsNone(self.router.db_for_read(Session))
+        self.assertEqual(self.router.db_for_write(models.Project), 'default')
+        self.assertTrue(routers.wrote())
+        self.assertFalse(self.router.allow_migrate('replica', 'accounts'))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_marked_views_read_from_replicas(self):
+        middleware = ReplicaMiddleware(lambda request: None)
+        for view, method, pinned_until, expected in [
+            (views.IndexView.as_view(), 'get', 0, True),
+            (views.search, 'get', 0, True),
+            (api.projects, 'get', 0, True),
+            (views.IndexView.as_view(), 'post', 0, False),
+            (views.ApplicationView.as_view(), 'get', 0, False),
+            (views.IndexView.as_view(), 'get', time.time() + 60, False),
+        ]:
+            routers.reset()
+            middleware.process_view(self.request(method, pinned_until), view, (), {})
+            self.assertEqual(self.router.db_for_read(models.Project) == 'replica', expected, (view, method))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_versioned_caches_are_built_from_the_primary(self):
+        project = models.Project.objects.create(user=self.new_user, title="Test Project")
+        models.Position.objects.create(project=project, name="Developer", skill="Python")
+        routers.use_replicas()
+        # There is no 'replica' database here, so a replica read would fail
+        matrix = matching.PositionMatrix.build(None)
+        self.assertEqual(len(matrix.rows), 1)
+        self.assertEqual(list(views.listed_projects()), [project])
+
+    def test_writes_pin_the_session(self):
+        self.client.post(reverse('accounts:sign_in'), {'username': "test@test.com", 'password': "password"})
+        # Signing in updates last_login
+        session = self.client.session
+        self.assertIn(ReplicaMiddleware.PIN_KEY, session)
+        del session[ReplicaMiddleware.PIN_KEY]
+        session.save()
+
+        self.client.get(reverse('accounts:index'))
+        self.assertNotIn(ReplicaMiddleware.PIN_KEY, self.client.session)
+        skill = models.Skill.objects.create(user=self.new_user, name="Python")
+        self.client.get(reverse('accounts:skill_delete', kwargs={'pk': skill.id}))
+        self.assertGreater(self.client.session[ReplicaMiddleware.PIN_KEY], time.time())
+
+
+class ApplicationCountsTest(TestCase):
+    def setUp(self):
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        project = models.Project.objects.create(user=self.owner, title="Test Project")
+        self.positions = [models.Position.objects.create(project=project, name="Position {}".format(number))
+                          for number in range(2)]
+        self.applicants = [models.User.objects.create(username="applicant{}@test.com".format(number)).profile
+                           for number in range(3)]
+
+    def counts(self, owner=None, position=None):
+        if position is not None:
+            counts = models.PositionApplicationCounts.objects.get(position=position)
+        else:
+            counts = models.OwnerApplicationCounts.objects.get(owner=owner or self.owner)
+        return counts.undecided, counts.approved, counts.denied
+
+    def test_counts_follow_applications(self):
+        applications = [models.Application.objects.create(user=applicant, position=self.positions[0])
+                        for applicant in self.applicants]
+        models.Application.objects.create(user=self.applicants[0], position=self.positions[1])
+        self.assertEqual(self.counts(), (4, 0, 0))
+        self.assertEqual(self.counts(position=self.positions[0]), (3, 0, 0))
+
+        application = models.Application.objects.get(id=applications[0].id)
+        application.status = choices.APPROVED
+        application.save()
+        application.save()
+        applications[1].status = choices.DENIED
+        applications[1].save()
+        self.assertEqual(self.counts(), (2, 1, 1))
+        self.assertEqual(self.counts(position=self.positions[0]), (1, 1, 1))
+
+        applications[2].delete()
+        self.positions[1].delete()
+        self.assertEqual(self.counts(), (0, 1, 1))
+
+        models.OwnerApplicationCounts.objects.all().delete()
+        models.rebuild_application_counts()
+        self.assertEqual(self.counts(), (0, 1, 1))
+
+    def test_delete_position_with_applications(self):
+        position = self.positions[0]
+        for applicant in self.applicants:
+            models.Application.objects.create(user=applicant, position=position)
+        with transaction.atomic():
+            position.delete()
+            # The cascade removed the counter row first; nothing may recreate it
+            self.assertFalse(models.PositionApplicationCounts.objects.filter(position_id=position.id).exists())
+            connection.check_constraints()
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_inbox_header_and_badge(self):
+        models.Application.objects.create(user=self.applicants[0], position=self.positions[0])
+        self.client.login(username="owner@test.com", password="password")
+        response = self.client.get(reverse('accounts:applications'))
+        self.assertContains(response, "Applications (1 new)")
+        self.assertContains(response, "1 new, 0 accepted, 0 rejected")
+
+
+class IdentityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.new_user.profile.first_name = "Tess"
+        self.new_user.profile.save()
+        models.Skill.objects.create(user=self.new_user, name="Python")
+        self.client.login(username="test@test.com", password="password")
+
+    def identity_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('accounts:profile'))
+        return response, [query for query in context.captured_queries
+                          if query['sql'].startswith('SELECT "accounts_profile"."id"')
+                          or 'FROM "accounts_skill"' in query['sql']]
+
+    def test_identity_is_cached_between_requests(self):
+        response, queries = self.identity_queries()
+        self.assertEqual(len(queries), 2)
+        self.assertContains(response, "Sign Out Tess")
+        response, queries = self.identity_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual([skill.name for skill in response.context['skills']], ["Python"])
+
+    def test_edits_invalidate_the_identity(self):
+        self.identity_queries()
+        models.Skill.objects.create(user=self.new_user, name="Django")
+        response, queries = self.identity_queries()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([skill.name for skill in response.context['skills']], ["Python", "Django"])
+
+        profile = self.new_user.profile
+        profile.first_name = "Renamed"
+        profile.save()
+        self.assertContains(self.client.get(reverse('accounts:profile')), "Sign Out Renamed")
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_loaded_from_the_primary(self):
+        self.addCleanup(routers.reset)
+        routers.use_replicas()
+        # There is no 'replica' database here, so a replica read would fail
+        data = identity.load(self.new_user.id)
+        self.assertEqual(data['profile'].first_name, "Tess")
+        self.assertEqual([skill.name for skill in data['skills']], ["Python"])
+
+    def test_anonymous(self):
+        self.client.logout()
+        response = self.client.get(reverse('accounts:sign_in'))
+        self.assertIsNone(response.context['identity'].profile)
+        self.assertEqual(response.context['identity'].skills, [])
+
+
+class AssetsTest(TestCase):
+    def test_css_imports_are_inlined_and_minified(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'main.css'), 'w') as output:
+                output.write('@import "parts/b.css";\n/* @import "missing.css"; */\n.a > .c ,\n.d {\n  color: red;\n}\n')
+            os.mkdir(os.path.join(directory, 'parts'))
+            with open(os.path.join(directory, 'parts', 'b.css'), 'w') as output:
+                output.write('@import url(print.css) print;\n.b { content: "x  /* y */"; }\n')
+            with open(os.path.join(directory, 'parts', 'print.css'), 'w') as output:
+                output.write('.p { display: none; }')
+            css = assets.minify_css(assets.read_css(os.path.join(directory, 'main.css')))
+        self.assertEqual(css, '@media print{.p{display:none}}.b{content:"x  /* y */"}.a>.c,.d{color:red}')
+
+    def test_collected_bundles_are_hashed_precompressed_and_cached(self):
+        with tempfile.TemporaryDirectory() as static_root, tempfile.TemporaryDirectory() as build_dir:
+            # As on a clean checkout: the build directory is not in STATICFILES_DIRS yet
+            with self.settings(STATIC_ROOT=static_root, ASSETS_BUILD_DIR=build_dir,
+                               STATICFILES_DIRS=[os.path.join(settings.BASE_DIR, 'static')]):
+                call_command('build_assets', verbosity=0, stdout=io.StringIO())
+                page = self.client.get(reverse('accounts:sign_in')).content.decode()
+                bundle_url = staticfiles_storage.url('css/bundle.css')
+                self.assertRegex(bundle_url, r'^/static/css/bundle\.[0-9a-f]{12}\.css$')
+                self.assertIn('href="{}"'.format(bundle_url), page)
+                self.assertNotIn('global.css', page)
+
+                response = self.client.get(bundle_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertEqual(response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+                with open(os.path.join(build_dir, 'css', 'bundle.css'), 'rb') as source:
+                    self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), source.read())
+
+                response = self.client.get('/static/css/bundle.css')
+                self.assertNotIn('Content-Encoding', response)
+                self.assertEqual(response['Cache-Control'], assets.CACHE_CONTROL)
+                self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+
+class MediaTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        os.mkdir(os.path.join(self.media_root.name, 'avatars'))
+        with open(os.path.join(self.media_root.name, 'avatars', 'a.png'), 'wb') as output:
+            output.write(b'0123456789')
+        self.url = settings.MEDIA_URL + 'avatars/a.png'
+        self.new_user = models.User.objects.create(username="test@test.com")
+        self.new_user.set_password('password')
+        self.new_user.save()
+        self.client.login(username="test@test.com", password="password")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_signed_in_users_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_files_outside_the_media_directories_are_not_served(self):
+        with open(os.path.join(self.media_root.name, 'secret.txt'), 'w') as output:
+            output.write('secret')
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'secret.txt').status_code, 404)
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'avatars/../secret.txt').status_code, 404)
+
+    def test_conditional_and_range_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=20-').status_code, 416)
+        # The file changed since the client's partial copy: send all of it
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_transfer_is_handed_to_the_front_end_server(self):
+        with self.settings(MEDIA_ACCEL='nginx'):
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Accel-Redirect'], settings.MEDIA_ACCEL_PREFIX + 'avatars/a.png')
+            self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_ACCEL='apache'):
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root.name, 'avatars', 'a.png'))
+
+
+class ConditionalGetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        self.project = models.Project.objects.create(user=self.owner, title="Test Project")
+        self.position = models.Position.objects.create(project=self.project, name="Developer", skill="Django")
+        self.client.login(username="owner@test.com", password="password")
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_project_page_is_not_modified(self):
+        url = reverse('accounts:project', kwargs={'pk': self.project.id})
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('Last-Modified', response)
+        # session and user; the project card and identity are cached
+        with self.assertMaxQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_position_changes_touch_the_project(self):
+        url = reverse('accounts:project', kwargs={'pk': self.project.id})
+        etag = self.client.get(url)['ETag']
+        before = models.Project.objects.get(id=self.project.id).updated
+        self.position.status = choices.FILLED
+        self.position.save()
+        self.assertGreater(models.Project.objects.get(id=self.project.id).updated, before)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile_and_index_pages(self):
+        for url in (reverse('accounts:profile'), reverse('accounts:index')):
+            self.assertEqual(self.revalidate(url).status_code, 304)
+
+        etag = self.client.get(reverse('accounts:profile'))['ETag']
+        models.Skill.objects.create(user=self.owner, name="Python")
+        self.assertEqual(self.client.get(reverse('accounts:profile'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse('accounts:index'))['ETag']
+        models.Project.objects.create(user=self.owner, title="Another Project")
+        self.assertEqual(self.client.get(reverse('accounts:index'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_project_leaves_the_index(self):
+        url = reverse('accounts:index')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(time.time() + 3600)
+        self.project.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Test Project")
+
+    def test_pages_differ_per_user(self):
+        url = reverse('accounts:project', kwargs={'pk': self.project.id})
+        etag = self.client.get(url)['ETag']
+        other = models.User.objects.create(username="other@test.com")
+        other.set_password('password')
+        other.save()
+        self.client.login(username="other@test.com", password="password")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ProjectDeletionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        self.project = models.Project.objects.create(user=self.owner, title="Doomed Project", skill_needs="Django")
+        self.kept = models.Project.objects.create(user=self.owner, title="Kept Project")
+        models.Position.objects.create(project=self.kept, name="Tester", skill="Django")
+        self.applicants = [models.User.objects.create(username="applicant{}@test.com".format(number))
+                           for number in range(5)]
+        for number in range(5):
+            position = models.Position.objects.create(
+                project=self.project, name="Developer {}".format(number), skill="Django")
+            for applicant in self.applicants[:number]:
+                models.Application.objects.create(user=applicant.profile, position=position)
+        self.client.login(username="owner@test.com", password="password")
+
+    def test_deleted_project_is_hidden_at_once(self):
+        facet = models.SkillFacet.objects.get(tag__slug='django')
+        self.assertEqual(facet.open_positions, 6)
+        response = self.client.post(reverse('accounts:project_delete', kwargs={'pk': self.project.id}))
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+
+        self.assertFalse(models.Project.objects.filter(id=self.project.id).exists())
+        self.assertTrue(models.Project.all_objects.filter(id=self.project.id).exists())
+        self.assertFalse(models.Position.objects.filter(project_id=self.project.id).exists())
+        self.assertFalse(models.Application.objects.exists())
+        self.assertEqual(models.Application.all_objects.count(), 10)
+        facet.refresh_from_db()
+        self.assertEqual(facet.open_positions, 1)
+        self.assertEqual(models.OwnerApplicationCounts.objects.get(owner=self.owner).undecided, 0)
+
+        self.assertEqual(self.client.get(reverse('accounts:project', kwargs={'pk': self.project.id})).status_code, 404)
+        response = self.client.get(reverse('accounts:search'), {'q': 'Doomed'})
+        self.assertEqual(list(response.context['projects']), [])
+        self.assertFalse(deletion.soft_delete_project(self.project.id))
+
+        search.rebuild_index()
+        self.assertEqual(search.search_project_ids('Doomed'), [])
+
+    def test_hard_delete_after_soft_delete_counts_once(self):
+        other_owner = models.User.objects.create(username="other@test.com")
+        other = models.Project.objects.create(user=other_owner, title="Other Project")
+        position = models.Position.objects.create(project=other, name="Reviewer", skill="Django")
+        models.Application.objects.create(user=self.applicants[0].profile, position=position)
+        deletion.soft_delete_project(self.project.id)
+
+        self.owner.delete()
+        self.assertEqual(models.SkillFacet.objects.get(tag__slug='django').open_positions, 1)
+        self.assertEqual(models.PositionApplicationCounts.objects.get(position=position).undecided, 1)
+        self.assertEqual(models.OwnerApplicationCounts.objects.get(owner=other_owner).undecided, 1)
+
+    def test_deleted_rows_do_not_load_their_project(self):
+        deletion.soft_delete_project(self.project.id)
+        with CaptureQueriesContext(connection) as context:
+            self.owner.delete()
+        loads = [query['sql'] for query in context.captured_queries
+                 if query['sql'].startswith('SELECT') and '"accounts_project"."title"' in query['sql']]
+        # Only the collector's own; none per deleted position and application
+        self.assertEqual(len(loads), 1)
+
+    def test_purge_deletes_in_bounded_batches(self):
+        deletion.soft_delete_project(self.project.id)
+        with CaptureQueriesContext(connection) as context:
+            counts = deletion.purge_deleted(batch_size=2)
+        self.assertEqual(counts['accounts.Project'], 1)
+        self.assertEqual(counts['accounts.Position'], 5)
+        self.assertEqual(counts['accounts.Application'], 10)
+        self.assertEqual(counts['accounts.PositionApplicationCounts'], 4)
+
+        deletes = [query['sql'] for query in context.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertTrue(deletes)
+        for sql in deletes:
+            self.assertLessEqual(sql.count(','), 1, sql)
+
+        self.assertFalse(models.Project.all_objects.filter(id=self.project.id).exists())
+        self.assertEqual(models.Application.all_objects.count(), 0)
+        self.assertFalse(models.Project.skill_tags.through.objects.filter(project_id=self.project.id).exists())
+        self.assertEqual(models.Position.objects.filter(project=self.kept).count(), 1)
+        self.assertEqual(deletion.purge_deleted(), {})
+
+
+class BulkDecisionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = models.User.objects.create(username="owner@test.com")
+        self.owner.set_password('password')
+        self.owner.save()
+        self.owner.profile.email = "owner@test.com"
+        self.owner.profile.save()
+        project = models.Project.objects.create(user=self.owner, title="Test Project")
+        self.position = models.Position.objects.create(project=project, name="Developer", skill="Django")
+        self.other_position = models.Position.objects.create(project=project, name="Designer", skill="css")
+        self.applications = []
+        for number in range(3):
+            applicant = models.User.objects.create(username="applicant{}@test.com".format(number))
+            self.applications.append(models.Application.objects.create(user=applicant.profile, position=self.position))
+        self.untouched = models.Application.objects.create(user=applicant.profile, position=self.other_position)
+        self.client.login(username="owner@test.com", password="password")
+
+    def decide(self, applications, status, deny_others=False):
+        data = {'application': [application.id for application in applications], 'status': status}
+        if deny_others:
+            data['deny_others'] = 'on'
+        return self.client.post(reverse('accounts:applications_decide'), data)
+
+    def test_approving_fills_the_position_and_denies_the_rest(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.decide(self.applications[:1], choices.APPROVED, deny_others=True)
+        self.assertRedirects(response, reverse('accounts:applications'), fetch_redirect_response=False)
+
+        statuses = dict(models.Application.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.applications[0].id], choices.APPROVED)
+        self.assertEqual(statuses[self.applications[1].id], choices.DENIED)
+        self.assertEqual(statuses[self.applications[2].id], choices.DENIED)
+        self.assertEqual(statuses[self.untouched.id], choices.UNDECIDED)
+        self.position.refresh_from_db()
+        self.assertEqual(self.position.status, choices.FILLED)
+        self.assertEqual(models.SkillFacet.objects.get(tag__slug='django').open_positions, 0)
+
+        counts = models.OwnerApplicationCounts.objects.get(owner=self.owner)
+        self.assertEqual((counts.undecided, counts.approved, counts.denied), (1, 1, 2))
+        self.assertEqual(models.PositionApplicationCounts.objects.get(position=self.position).denied, 2)
+
+        self.assertEqual(models.OutboxMessage.objects.count(), 3)
+        inserts = [query for query in context.captured_queries
+                   if query['sql'].startswith('INSERT INTO "accounts_outboxmessage"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertContains(self.client.get(reverse('accounts:applications')), "3 application(s) updated")
+
+    def test_denying_leaves_the_position_open(self):
+        self.decide(self.applications[:2], choices.DENIED)
+        self.assertEqual(models.Application.objects.filter(status=choices.DENIED).count(), 2)
+        self.position.refresh_from_db()
+        self.assertEqual(self.position.status, choices.OPEN)
+        self.assertEqual(models.OutboxMessage.objects.count(), 2)
+
+    def test_concurrent_decisions_are_counted_once(self):
+        stale = list(models.Application.objects.select_related('user__user', 'position')
+                     .filter(id__in=[application.id for application in self.applications[:2]]))
+        # Decided from the detail page after the inbox form loaded them
+        application = models.Application.objects.get(id=self.applications[0].id)
+        application.status = choices.DENIED
+        application.save()
+
+        changed, filled = decisions.decide([(application, choices.DENIED) for application in stale],
+                                           self.owner.profile)
+        self.assertEqual((changed, filled), (1, 0))
+        counts = models.OwnerApplicationCounts.objects.get(owner=self.owner)
+        self.assertEqual((counts.undecided, counts.approved, counts.denied), (2, 0, 2))
+        self.assertEqual(models.OutboxMessage.objects.count(), 1)
+
+    def test_only_applications_to_own_projects(self):
+        intruder = models.User.objects.create(username="intruder@test.com")
+        intruder.set_password('password')
+        intruder.save()
+        self.client.login(username="intruder@test.com", password="password")
+        self.decide(self.applications, choices.APPROVED)
+        self.assertFalse(models.Application.objects.exclude(status=choices.UNDECIDED).exists())
+        self.assertFalse(models.OutboxMessage.objects.exists())
@@ -1,24 +1,44 @@
+import json
+
 from django.contrib import messages
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
-from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, DateTimeField, IntegerField, Max, OuterRef, Q, Subquery
 from django.urls import reverse
+from django.utils.text import slugify
 from django.urls import reverse_lazy
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView, ListView, DeleteView
 from django.views.generic.edit import UpdateView, CreateView
-from django.core.mail import send_mail
 
 
 from django.forms import inlineformset_factory
 
 from . import models
 from . import forms
+from . import caching
 from . import choices
+from . import decisions
+from . import deletion
+from . import exports
+from . import matching
+from . import metrics as request_metrics
+from . import notifications
+from . import readmodels
+from . import search as search_index
+from .conditional import ConditionalMixin
+from .pagination import Page, keyset_page, PAGE_SIZE
+from .routers import replica_reads
+
+
+RECOMMENDATIONS_ON_PROFILE = 5
 
 
 class SignInView(LoginView):
@@ -34,23 +54,35 @@ class RegisterView(CreateView):
     success_url = reverse_lazy('accounts:sign_in')
 
 
-class IndexView(TemplateView):
+def listed_projects():
+    """Projects for the cached project_table fragment of index.html, always read from the primary"""
+    return models.Project.objects.using(DEFAULT_DB_ALIAS)
+
+
+@replica_reads
+class IndexView(ConditionalMixin, TemplateView):
     """Index overview of projects"""
     template_name = 'accounts/index.html'
     model = models.Project
 
+    def page_state(self):
+        # The listing version changes with every project and position write,
+        # deletes included; no Last-Modified, as the newest update does not
+        # move when a project is deleted
+        return caching.projects_version(), None
+
     def get_context_data(self, **kwargs):
-        skills = []
-        for skill in choices.SKILLS:
-            skills.append(skill[0])
         context = super().get_context_data(**kwargs)
-        context['projects'] = models.Project.objects.all()
-        context['positions'] = models.Position.objects.all()
-        context['skills'] = skills
+        # Read only when the fragment misses, then cached under the current projects
+        # version; a page from a lagging replica would outlive its catching up
+        context['projects'] = keyset_page(listed_projects(), self.request.GET.get('after'))
+        context['projects_version'] = caching.projects_version()
+        context['facets'] = models.SkillFacet.objects.sidebar()
         return context
 
 
-class ProfileView(LoginRequiredMixin, TemplateView):
+@replica_reads
+class ProfileView(LoginRequiredMixin, ConditionalMixin, TemplateView):
     """
     Login Required-Redirects to sign in page
     Signed in user's profile view
@@ -59,15 +91,58 @@ class ProfileView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/profile.html'
     model = models.Profile
 
+    def page_state(self):
+        # The profile (touched by skill changes), the user's projects and
+        # applications (recommendations leave out applied positions), and
+        # the listing version, which covers the recommended positions
+        projects = models.Project.objects.filter(user_id=OuterRef('user_id')).order_by().values('user_id')
+        applications = models.Application.objects.filter(user_id=OuterRef('id')).order_by().values('user_id')
+        state = models.Profile.objects.filter(user_id=self.request.user.id).values_list(
+            'updated',
+            Subquery(projects.annotate(last=Max('updated')).values('last'), output_field=DateTimeField()),
+            Subquery(projects.annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+            Subquery(applications.annotate(last=Max('updated')).values('last'), output_field=DateTimeField()),
+            Subquery(applications.annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+        ).first() or (None,) * 5
+        profile_updated, projects_updated, project_count, applied, application_count = state
+        last_modified = max(filter(None, (profile_updated, projects_updated, applied)), default=None)
+        return (state, caching.projects_version()), last_modified
+
     def get_context_data(self, **kwargs):
         user = self.request.user
+        identity = self.request.identity
         context = super().get_context_data(**kwargs)
-        context['profile'] = models.Profile.objects.get(user=user)
+        context['profile'] = identity.profile
         context['projects'] = models.Project.objects.filter(user=user)
-        context['skills'] = models.Skill.objects.filter(user=user)
+        context['skills'] = identity.skills
+        context['recommendations'] = matching.recommend(
+            user, identity.skill_tag_ids, limit=RECOMMENDATIONS_ON_PROFILE)
         return context
 
 
+@replica_reads
+@login_required(redirect_field_name='accounts:sign_in')
+def recommended_positions(request):
+    """Open positions ranked against the signed in user's skills"""
+    positions = matching.recommend(request.user, request.identity.skill_tag_ids)
+    return JsonResponse({'positions': [{
+        'id': position.id,
+        'name': position.name,
+        'skill': position.skill,
+        'project': position.project.title,
+        'url': reverse('accounts:project', kwargs={'pk': position.project_id}),
+        'score': position.match_score,
+    } for position in positions]})
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, only answered for METRICS_ALLOWED_IPS"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    return HttpResponse(request_metrics.render(request_metrics.collect()),
+                        content_type=request_metrics.CONTENT_TYPE)
+
+
 @login_required(redirect_field_name='accounts:sign_in')
 def delete_skill(request, pk=None):
     """Delete skill from skills list"""
@@ -134,7 +209,8 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
                 if name:
                     skills.append(models.Skill(
                         name=name,
-                        user=user
+                        user=user,
+                        tag=models.SkillTag.objects.for_name(name)
                     ))
             try:
                 with transaction.atomic():
@@ -150,6 +226,20 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
                 skill_formset=skill_formset))
 
 
+def new_positions(project, position_forms):
+    """Unsaved open positions for every filled in position form"""
+    return [
+        models.Position(
+            project=project,
+            name=position.cleaned_data.get('name'),
+            descript=position.cleaned_data.get('descript'),
+            skill=position.cleaned_data.get('skill'),
+            status=choices.OPEN
+        )
+        for position in position_forms if position.cleaned_data.get('name')
+    ]
+
+
 class ProjectCreateView(LoginRequiredMixin, CreateView):
     """Create project with positions"""
     template_name = 'accounts/project_new.html'
@@ -170,19 +260,11 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
         position_form = self.second_form_class(request.POST, prefix='position')
 
         if project_form.is_valid() and position_form.is_valid():
-            project = project_form.save(commit=False)
-            project.user = user
-            project.save()
-
-            for position in position_form:
-                if position.cleaned_data.get('name'):
-                    models.Position.objects.create(
-                        project=project,
-                        name=position.cleaned_data.get('name'),
-                        descript=position.cleaned_data.get('descript'),
-                        skill=position.cleaned_data.get('skill'),
-                        status='open'
-                    )
+            with transaction.atomic():
+                project = project_form.save(commit=False)
+                project.user = user
+                project.save()
+                models.Position.objects.bulk_create(new_positions(project, position_form))
 
             return HttpResponseRedirect(reverse('accounts:profile'))
         else:
@@ -192,6 +274,44 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
                                                              'position_form': position_form})
 
 
+@login_required(redirect_field_name='accounts:sign_in')
+@require_POST
+def project_bulk_create(request):
+    """
+    Create a project with any number of positions from one JSON payload:
+    {"title": ..., "description": ..., "positions": [{"name": ..., "skill": ..., "descript": ...}]}
+    """
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return JsonResponse({'errors': {'payload': ['Invalid JSON']}}, status=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get('positions', []), list):
+        return JsonResponse({'errors': {'payload': ['Expected an object with a list of positions']}}, status=400)
+
+    project_form = forms.ProjectForm(payload)
+    position_forms = [forms.PositionForm(row if isinstance(row, dict) else {})
+                      for row in payload.get('positions', [])]
+    errors = {}
+    if not project_form.is_valid():
+        errors['project'] = project_form.errors
+    position_errors = {number: form.errors for number, form in enumerate(position_forms) if not form.is_valid()}
+    if position_errors:
+        errors['positions'] = position_errors
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    with transaction.atomic():
+        project = project_form.save(commit=False)
+        project.user = request.user
+        project.save()
+        positions = models.Position.objects.bulk_create(new_positions(project, position_forms))
+    return JsonResponse({
+        'id': project.id,
+        'positions': len(positions),
+        'url': reverse('accounts:project', kwargs={'pk': project.id}),
+    }, status=201)
+
+
 class ProjectUpdateView(LoginRequiredMixin, UpdateView):
     """Update Project- Add positions"""
     template_name = 'accounts/project_edit.html'
@@ -211,22 +331,10 @@ class ProjectUpdateView(LoginRequiredMixin, UpdateView):
         project_form = self.form_class(request.POST, instance=self.get_object(), prefix='project')
         position_form = self.second_form_class(request.POST, prefix='position')
         if project_form.is_valid() and position_form.is_valid():
-            models.Project.objects.filter(id=self.kwargs['pk']).update(
-                title=project_form.cleaned_data.get('title'),
-                description=project_form.cleaned_data.get('description'),
-                requirements=project_form.cleaned_data.get('requirements'),
-                skill_needs=project_form.cleaned_data.get('skill_needs'),
-                timeline=project_form.cleaned_data.get('timeline')
-            )
-            for position in position_form:
-                if position.cleaned_data.get('name'):
-                    models.Position.objects.create(
-                        project=models.Project.objects.get(id=self.kwargs['pk']),
-                        name=position.cleaned_data.get('name'),
-                        descript=position.cleaned_data.get('descript'),
-                        skill=position.cleaned_data.get('skill'),
-                        status='open'
-                    )
+            with transaction.atomic():
+                # save() rather than update() so the search index is refreshed
+                project = project_form.save()
+                models.Position.objects.bulk_create(new_positions(project, position_form))
 
             return HttpResponseRedirect(reverse('accounts:profile'))
         else:
@@ -236,20 +344,29 @@ class ProjectUpdateView(LoginRequiredMixin, UpdateView):
                                                               'position_form': position_form})
 
 
-class ProjectView(LoginRequiredMixin, TemplateView):
+@replica_reads
+class ProjectView(LoginRequiredMixin, ConditionalMixin, TemplateView):
     """View Project"""
     template_name = 'accounts/project.html'
     model = models.Project
 
+    def page_state(self):
+        # Position changes touch the project; the owner's profile has the byline
+        card = self.get_object()
+        state = (card['updated'], card['owner_updated'])
+        return state, max(filter(None, state), default=None)
+
     def get_object(self, queryset=None):
-        pk = self.kwargs['pk']
-        return get_object_or_404(models.Project, pk=pk)
+        """The cached project card rather than a model instance"""
+        if not hasattr(self, 'card'):
+            self.card = readmodels.project_card(self.kwargs['pk'])
+        if self.card is None:
+            raise Http404("No project found")
+        return self.card
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['project'] = self.get_object()
-        context['positions'] = models.Position.objects.filter(project=self.get_object())
-        context['all_positions'] = models.Position.objects.all()
         return context
 
 
@@ -266,6 +383,12 @@ class ProjectDeleteView(LoginRequiredMixin, DeleteView):
         project_id = self.object.id
         return models.Project.objects.filter(id=project_id)
 
+    def delete(self, request, *args, **kwargs):
+        """Hide the project now; purge_deleted_projects removes its rows in the background"""
+        self.object = self.get_object()
+        deletion.soft_delete_project(self.object.id)
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self):
         return reverse('accounts:profile')
 
@@ -274,19 +397,55 @@ class ApplicationView(LoginRequiredMixin, ListView):
     """View Application"""
     template_name = 'accounts/applications.html'
     model = models.Application
+    context_object_name = 'applications'
+
+    def get_queryset(self):
+        return models.Application.objects.filter(
+            position__project__user=self.request.user
+        ).select_related('user', 'position__project')
 
     def get_context_data(self, *, object_list=None, **kwargs):
-        skills = []
-        for skill in choices.SKILLS:
-            skills.append(skill[0])
-        context = super().get_context_data(**kwargs)
-        context['applications'] = models.Application.objects.filter(position__project__user=self.request.user)
-        context['projects'] = models.Project.objects.all()
-        context['profiles'] = models.Profile.objects.all()
-        context['skills'] = skills
+        # Evaluate once, then split by status in Python
+        applications = list(self.object_list)
+        context = super().get_context_data(object_list=applications, **kwargs)
+        context['new_applications'] = [app for app in applications if app.status == choices.UNDECIDED]
+        context['approved_applications'] = [app for app in applications if app.status == choices.APPROVED]
+        context['denied_applications'] = [app for app in applications if app.status == choices.DENIED]
+        context['projects'] = models.Project.objects.filter(user=self.request.user)
+        context['facets'] = models.SkillFacet.objects.sidebar()
         return context
 
 
+@login_required(redirect_field_name='accounts:sign_in')
+@require_POST
+def decide_applications(request):
+    """Approve or deny the applications selected in the inbox in one go"""
+    form = forms.DecisionForm(request.user, request.POST)
+    if form.is_valid():
+        status = form.cleaned_data['status']
+        changed, filled = decisions.decide(
+            ((application, status) for application in form.cleaned_data['application']),
+            request.identity.profile,
+            deny_others=form.cleaned_data['deny_others'],
+        )
+        messages.success(request, "{} application(s) updated, {} position(s) filled".format(changed, filled))
+    else:
+        messages.error(request, "Select the applications and whether to approve or deny them")
+    return HttpResponseRedirect(reverse('accounts:applications'))
+
+
+@login_required(redirect_field_name='accounts:sign_in')
+def export_applications(request, pk=None):
+    """Stream the applications to the user's projects, or to one of them, as CSV"""
+    if pk is not None:
+        get_object_or_404(models.Project.objects.only('id'), pk=pk, user=request.user)
+    response = StreamingHttpResponse(exports.csv_lines(exports.applications_for(request.user, pk)),
+                                     content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="applications{}.csv"'.format(
+        '-project-{}'.format(pk) if pk else '')
+    return response
+
+
 class ApplicationCreateView(LoginRequiredMixin, CreateView):
     """Create application for existing project/position"""
     template_name = 'accounts/application.html'
@@ -305,7 +464,7 @@ class ApplicationCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form = form.save(commit=False)
-        form.user = models.Profile.objects.get(user=self.request.user)
+        form.user = self.request.identity.profile
         form.status = "undecided"
         form.position = models.Position.objects.get(id=self.kwargs['pk'])
         form.save()
@@ -316,7 +475,9 @@ class ApplicationCreateView(LoginRequiredMixin, CreateView):
 
         if application.is_valid():
             try:
-                self.form_valid(application)
+                # Savepoint, so a duplicate application leaves the connection usable
+                with transaction.atomic():
+                    self.form_valid(application)
             except IntegrityError:
                 messages.error(
                     self.request, 'Username or Password invalid. Please try again')
@@ -335,41 +496,29 @@ class ApplicationUpdateView(LoginRequiredMixin, UpdateView):
 
     def get_object(self, queryset=None):
         pk = self.kwargs['pk']
-        return get_object_or_404(models.Application, pk=pk)
+        return get_object_or_404(models.Application.objects.select_related('user__user', 'position'), pk=pk)
 
     def get_context_data(self, **kwargs):
-        app = self.get_object()
         context = super().get_context_data(**kwargs)
-        context['profile'] = models.Profile.objects.get(id=app.user.id)
-        context['projects'] = models.Project.objects.filter(user=context['profile'].user)
-        context['skills'] = models.Skill.objects.filter(user=context['profile'].user)
+        applicant = self.object.user
+        context['profile'] = applicant
+        context['projects'] = models.Project.objects.filter(user_id=applicant.user_id)
+        context['skills'] = models.Skill.objects.filter(user_id=applicant.user_id)
         context['application'] = self.form_class()
         return context
 
     def form_valid(self, form):
-        profile = models.Profile.objects.get(id=self.request.user.id)
-        applicant = models.Profile.objects.get(application=self.get_object())
-        subject = "Your application for {}".format(models.Application.objects.get(id=self.kwargs['pk']))
-        if form.cleaned_data.get('status') == 'approved':
-            message = "Congratulations!  You've been approved!"
-        elif form.cleaned_data.get('status') == 'denied':
-            message = "Thank you for your interest, but there was someone else we liked better."
-        else:
-            message = "Your application is under review"
-        recipient = applicant.user.username
-        print(subject)
-        print(message)
-        print(profile.user.username)
-        print(recipient)
-        send_mail(subject=subject, message=message, from_email=profile.email, recipient_list=[recipient])
-        return super(ApplicationUpdateView, self).form_valid(form)
+        # The email is queued with the status change and sent by the send_outbox command
+        with transaction.atomic():
+            response = super(ApplicationUpdateView, self).form_valid(form)
+            notifications.queue_decision(self.object, self.request.identity.profile)
+        return response
 
     def post(self, request, *args, **kwargs):
-        application = self.form_class(request.POST, instance=self.get_object())
+        self.object = self.get_object()
+        application = self.form_class(request.POST, instance=self.object)
         if application.is_valid():
-            self.form_valid(application)
-            application.save()
-            return HttpResponseRedirect(reverse('accounts:applications'))
+            return self.form_valid(application)
         else:
             return HttpResponseRedirect(reverse('accounts:applications'))
 
@@ -377,22 +526,47 @@ class ApplicationUpdateView(LoginRequiredMixin, UpdateView):
         return reverse('accounts:applications')
 
 
+def _search_page(term, cursor):
+    """One page of FTS results, ranked by relevance"""
+    after = search_index.parse_cursor(cursor)
+
+    def fetch(limit):
+        results = search_index.search_projects(term, after=after, limit=limit)
+        found = listed_projects().in_bulk([project_id for project_id, score in results])
+        projects = []
+        for project_id, score in results:
+            if project_id in found:
+                project = found[project_id]
+                project.search_score = score
+                projects.append(project)
+        return projects
+
+    return Page(fetch, PAGE_SIZE, lambda project: search_index.format_cursor(project.search_score, project.id))
+
+
+@replica_reads
 @login_required(redirect_field_name='accounts:sign_in')
 def search(request):
     """Search Bar- search projects based on title and/or description"""
-    term = request.GET.get('q')
-    projects = models.Project.objects.all()
-    projects = projects.filter(
-        Q(title__icontains=term) | Q(description__icontains=term))
-    return render(request, 'accounts/index.html', {'projects': projects})
-
-
+    term = request.GET.get('q', '')
+    cursor = request.GET.get('after')
+    if search_index.is_available():
+        projects = _search_page(term, cursor)
+    else:
+        projects = keyset_page(listed_projects().filter(
+            Q(title__icontains=term) | Q(description__icontains=term)), cursor)
+    return render(request, 'accounts/index.html', {'projects': projects, 'q': term,
+                                                   'projects_version': caching.projects_version(),
+                                                   'facets': models.SkillFacet.objects.sidebar()})
+
+
+@replica_reads
 @login_required(redirect_field_name='accounts:sign_in')
 def sort_by_skill(request, skillz=None):
     """Sort Projects based on position skills"""
-    skills = []
-    for skill in choices.SKILLS:
-        skills.append(skill[0])
-    projects = models.Project.objects.all()
-    projects = projects.filter(position__skill__icontains=skillz)
-    return render(request, 'accounts/index.html', {'projects': projects, 'skills': skills})
+    # Equality join on the indexed tag slug; DISTINCT as a project can have several matching positions
+    projects = listed_projects().filter(position__tag__slug=slugify(skillz)).distinct()
+    projects = keyset_page(projects, request.GET.get('after'))
+    return render(request, 'accounts/index.html', {'projects': projects,
+                                                   'projects_version': caching.projects_version(),
+                                                   'facets': models.SkillFacet.objects.sidebar()})
@@ -38,21 +38,27 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'accounts',
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.IdentityMiddleware',
+    'accounts.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# The debug toolbar is a development aid; production metrics are served at /metrics
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'soc_team_buider.urls'
 
 TEMPLATES = [
@@ -67,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.identity',
             ],
         },
     },
@@ -85,6 +92,49 @@ DATABASES = {
     }
 }
 
+# Read replicas
+# DATABASE_REPLICAS (comma separated) names SQLite files holding copies of
+# the primary; each becomes a 'replica<n>' database. Locally, copy the
+# primary into them with manage.py sync_replicas. Views marked
+# @replica_reads read from a replica unless the session wrote to the
+# primary within the last REPLICA_PIN_SECONDS.
+
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, name),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# Local memory suits a single process. With several worker processes set
+# CACHE_BACKEND to a shared backend, e.g.
+# django.core.cache.backends.filebased.FileBasedCache with CACHE_LOCATION
+# a directory, or a memcached backend with CACHE_LOCATION host:port.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'soc-team-builder'),
+    }
+}
+
+
+# Metrics
+# /metrics only answers these addresses. With several worker processes set
+# METRICS_DIR to a directory the workers share, emptied on server start, so
+# the endpoint reports all of them rather than the worker that answers.
+
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -126,12 +176,26 @@ INTERNAL_IPS = '127.0.0.1'
 
 STATIC_URL = '/static/'
 
-STATICFILES_DIRS = (
+STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
-)
+]
+
+# Bundles written by manage.py build_assets, collected with the other static files.
+# Listed once it exists, as collectstatic fails on a missing directory; on its first
+# run build_assets adds it itself
+ASSETS_BUILD_DIR = os.path.join(BASE_DIR, 'build', 'assets')
+if os.path.isdir(ASSETS_BUILD_DIR):
+    STATICFILES_DIRS.append(ASSETS_BUILD_DIR)
+
+STATIC_ROOT = os.environ.get('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+STATICFILES_STORAGE = 'accounts.storage.PrecompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Hand media downloads to the front-end server: 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile)
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+# nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
@@ -16,14 +16,18 @@ Including another URLconf
 from django.conf.urls import url, include
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path
 
+from accounts import assets
+from accounts import media
+
 
 urlpatterns = [
     url('admin/', admin.site.urls),
+    url(r'^{}(?P<path>.+)$'.format(settings.STATIC_URL.lstrip('/')), assets.serve, name='static'),
+    url(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')), media.serve, name='media'),
     url(r'^', include('accounts.urls')),
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+]
 
 if settings.DEBUG:
     import debug_toolbar
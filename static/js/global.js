@@ -32,7 +32,11 @@ $( document ).ready(function() {
    });
 
   // Clickable table row
-  $(".clickable-row").click(function() {
+  $(".clickable-row").click(function(event) {
+      // Ticking a checkbox in the row should not open the row's link
+      if ($(event.target).is("input, label")) {
+        return;
+      }
       var link = $(this).data("href");
       var target = $(this).data("target");
 